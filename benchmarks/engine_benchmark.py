@@ -0,0 +1,97 @@
+"""Hot path benchmark of the HomieManager engine, without Home Assistant.
+
+Feeds a simulated fleet straight into homie.manager.HomieManager and flushes
+every batch synchronously, so only the engine itself is measured. The
+homeassistant package does not have to be installed.
+
+    python benchmarks/engine_benchmark.py --devices 200 --nodes 4 --properties 5 --ticks 10
+        [--profile] [--json]
+"""
+# IMPORTS
+import argparse
+import asyncio
+import cProfile
+import json
+import os
+import pstats
+import sys
+import time
+from fleet_simulator import (HomieFleet)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import_started = time.perf_counter()
+from homie.manager import (HomieManager)
+IMPORT_SECONDS = time.perf_counter() - import_started
+
+# CONSTANTS
+PROFILE_LINES = 25
+
+
+def run(fleet: HomieFleet, ticks: int, value_fraction: float) -> dict:
+    loop = asyncio.new_event_loop()
+    ready = list()
+    manager = HomieManager(loop, property_ready=ready.append)
+
+    def feed(messages):
+        for topic, payload in messages:
+            manager.feed(topic, payload)
+        manager.flush()
+
+    # Retained burst, as dumped by the broker on subscribe
+    burst = list(fleet.retained_messages())
+    started = time.perf_counter()
+    feed(burst)
+    discovery_seconds = time.perf_counter() - started
+
+    # Periodic $stats and value traffic
+    steady_messages = 0
+    started = time.perf_counter()
+    for tick in range(1, ticks + 1):
+        messages = fleet.stats_messages(tick) + fleet.value_messages(tick, value_fraction)
+        feed(messages)
+        steady_messages += len(messages)
+    steady_seconds = time.perf_counter() - started
+
+    manager.stop()
+    loop.close()
+    return {
+        'import_ms': IMPORT_SECONDS * 1000,
+        'devices': len(manager.devices()),
+        'ready_properties': len(set(ready)),
+        'burst_messages': len(burst),
+        'burst_messages_per_second': len(burst) / discovery_seconds,
+        'steady_messages': steady_messages,
+        'steady_messages_per_second': steady_messages / steady_seconds if steady_seconds else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--devices', type=int, default=200)
+    parser.add_argument('--nodes', type=int, default=4)
+    parser.add_argument('--properties', type=int, default=5)
+    parser.add_argument('--ticks', type=int, default=10)
+    parser.add_argument('--value-fraction', type=float, default=0.5, help='Share of value properties changing per tick')
+    parser.add_argument('--profile', action='store_true', help='Print the functions with the most cumulative time')
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    fleet = HomieFleet(args.devices, args.nodes, args.properties)
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler is not None:
+        profiler.enable()
+    results = run(fleet, args.ticks, args.value_fraction)
+    if profiler is not None:
+        profiler.disable()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for key, value in results.items():
+            print(f'{key:<32} {value:>14,.3f}' if isinstance(value, float) else f'{key:<32} {value:>14,}')
+    if profiler is not None:
+        pstats.Stats(profiler, stream=sys.stdout).sort_stats('cumulative').print_stats(PROFILE_LINES)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Generate the MQTT traffic of a synthetic Homie 2.0 fleet."""
+# IMPORTS
+import random
+
+# TYPES
+from typing import (Iterator, List, Tuple)
+
+Message = Tuple[str, str]
+
+# CONSTANTS
+DEFAULT_PREFIX = 'homie'
+HOMIE_VERSION = '2.0.0'
+STATS_INTERVAL = 60
+
+
+class HomieFleet:
+    # N devices x M nodes x K properties publishing like homie-esp8266 firmware
+
+    def __init__(self, devices: int, nodes: int, properties: int, prefix: str = DEFAULT_PREFIX, seed: int = 0):
+        self._prefix = prefix
+        self._device_ids = [f'device-{d:05d}' for d in range(devices)]
+        self._node_ids = [f'node-{n}' for n in range(nodes)]
+        self._property_ids = ['value'] + [f'property-{p}' for p in range(1, properties)]
+        self._random = random.Random(seed)
+        self._values = dict()
+
+    @property
+    def device_count(self):
+        """Return the number of devices in the fleet."""
+        return len(self._device_ids)
+
+    @property
+    def node_count(self):
+        """Return the number of nodes in the fleet."""
+        return len(self._device_ids) * len(self._node_ids)
+
+    @property
+    def property_count(self):
+        """Return the number of properties in the fleet."""
+        return self.node_count * len(self._property_ids)
+
+    def retained_messages(self) -> Iterator[Message]:
+        """Yield every retained topic, in the order a broker dumps them on subscribe."""
+        for device_id in self._device_ids:
+            base = f'{self._prefix}/{device_id}'
+            yield f'{base}/$homie', HOMIE_VERSION
+            yield f'{base}/$online', 'true'
+            yield f'{base}/$name', f'Simulated {device_id}'
+            yield f'{base}/$localip', '10.0.0.1'
+            yield f'{base}/$mac', '02:00:00:00:00:01'
+            yield f'{base}/$stats/interval', str(STATS_INTERVAL)
+            yield f'{base}/$fw/name', 'fleet-simulator'
+            yield f'{base}/$fw/version', '1.0.0'
+            yield f'{base}/$fw/checksum', '0123456789abcdef'
+            yield f'{base}/$implementation', 'esp8266'
+            yield f'{base}/$nodes', ','.join(f'{node_id}:sensor' for node_id in self._node_ids)
+            for node_id in self._node_ids:
+                yield f'{base}/{node_id}/$type', 'sensor'
+                yield f'{base}/{node_id}/$properties', ','.join(self._property_ids)
+                for property_id in self._property_ids:
+                    yield f'{base}/{node_id}/{property_id}', self._reading(f'{base}/{node_id}/{property_id}')
+
+    def stats_messages(self, tick: int) -> List[Message]:
+        """Return the $stats traffic of every device for one tick."""
+        messages = list()
+        for device_id in self._device_ids:
+            base = f'{self._prefix}/{device_id}'
+            messages.append((f'{base}/$stats/uptime', str(tick * STATS_INTERVAL)))
+            messages.append((f'{base}/$stats/signal', str(self._random.randint(40, 100))))
+        return messages
+
+    def value_messages(self, tick: int, fraction: float) -> List[Message]:
+        """Return a changed reading for a fraction of the 'value' properties."""
+        messages = list()
+        for device_id in self._device_ids:
+            for node_id in self._node_ids:
+                if self._random.random() < fraction:
+                    topic = f'{self._prefix}/{device_id}/{node_id}/value'
+                    messages.append((topic, self._reading(topic)))
+        return messages
+
+    def _reading(self, topic: str) -> str:
+        # Always a different reading than the last one published on the topic
+        value = self._values.get(topic)
+        while value == self._values.get(topic):
+            value = f'{self._random.uniform(-20, 40):.2f}'
+        self._values[topic] = value
+        return value
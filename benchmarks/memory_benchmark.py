@@ -0,0 +1,113 @@
+"""Report the resident bytes per Homie Device, Node, Property and retained topic.
+
+    python benchmarks/memory_benchmark.py --devices 200 --nodes 5 --properties 10 [--json]
+"""
+# IMPORTS
+import argparse
+import gc
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from homie import (homie_classes, mqtt_message, retained_store, topic_router, topic_tokenizer)
+
+# CONSTANTS
+PREFIX = 'homie'
+DEVICE_ATTRIBUTES = {
+    '$homie': '2.0.0', '$online': 'true', '$name': 'Benchmark Device', '$localip': '192.168.0.10',
+    '$mac': 'DE:AD:BE:EF:FE:ED', '$stats/uptime': '120', '$stats/signal': '72', '$stats/interval': '60',
+    '$fw/name': 'benchmark', '$fw/version': '1.0.0', '$fw/checksum': 'c0ffee', '$implementation': 'esp8266',
+}
+
+
+def measure(action) -> int:
+    """Return the bytes still allocated after running action."""
+    gc.collect()
+    before = tracemalloc.take_snapshot()
+    action()
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    return sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+
+
+def run(device_count: int, node_count: int, property_count: int) -> dict:
+    store = retained_store.RetainedStore(max_size=10 ** 9)
+    tokenizer = topic_tokenizer.TopicTokenizer(PREFIX)
+    router = topic_router.TopicRouter(store, tokenizer)
+    devices = list()
+
+    def apply(owner, topic: str, payload: str):
+        # Uncached, so the tokenizer cache is not counted as model memory
+        owner._apply(tokenizer._tokenize(topic), payload)
+
+    def build_devices():
+        for d in range(device_count):
+            device_id = f'device-{d}'
+            device = homie_classes.HomieDevice(PREFIX, device_id, router)
+            router.register(device)
+            for subtopic, payload in DEVICE_ATTRIBUTES.items():
+                apply(device, f'{PREFIX}/{device_id}/{subtopic}', f'{payload}')
+            devices.append(device)
+
+    def build_nodes():
+        for device in devices:
+            for n in range(node_count):
+                apply(device, f'{device._prefix_topic}/node-{n}/$properties', '')
+                apply(device.node(f'node-{n}'), f'{device._prefix_topic}/node-{n}/$type', 'sensor')
+
+    def build_properties():
+        property_ids = ','.join(f'property-{p}' for p in range(property_count))
+        for device in devices:
+            for node in device.nodes:
+                apply(node, f'{node._prefix_topic}/$properties', property_ids)
+                for property in node.properties:
+                    apply(property, property._prefix_topic, f'{property.property_id}-value')
+
+    def build_store():
+        for device in devices:
+            for node in device.nodes:
+                for property in node.properties:
+                    topic = property._prefix_topic
+                    store.put(topic, mqtt_message.MQTTMessage(topic, f'{property.property_id}-value', 0))
+
+    tracemalloc.start()
+    device_bytes = measure(build_devices)
+    node_bytes = measure(build_nodes)
+    property_bytes = measure(build_properties)
+    store_bytes = measure(build_store)
+    tracemalloc.stop()
+
+    nodes = device_count * node_count
+    properties = nodes * property_count
+    return {
+        'devices': device_count,
+        'nodes': nodes,
+        'properties': properties,
+        'bytes_per_device': device_bytes / device_count,
+        'bytes_per_node': node_bytes / max(nodes, 1),
+        'bytes_per_property': property_bytes / max(properties, 1),
+        'bytes_per_retained_topic': store_bytes / max(properties, 1),
+        'total_bytes': device_bytes + node_bytes + property_bytes + store_bytes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--devices', type=int, default=200)
+    parser.add_argument('--nodes', type=int, default=5)
+    parser.add_argument('--properties', type=int, default=10)
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args()
+
+    results = run(args.devices, args.nodes, args.properties)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for key, value in results.items():
+            print(f'{key:>26}: {value:,.1f}' if isinstance(value, float) else f'{key:>26}: {value:,}')
+
+
+if __name__ == '__main__':
+    main()
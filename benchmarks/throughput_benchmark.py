@@ -0,0 +1,286 @@
+"""End-to-end throughput benchmark of the Homie component against a simulated fleet.
+
+Runs homie.component.async_setup with in-process stand-ins for mqtt.async_subscribe,
+async_load_platform and the hass object, so neither a broker nor a running Home
+Assistant is needed (the homeassistant package only has to be importable).
+
+    python benchmarks/throughput_benchmark.py --devices 200 --nodes 4 --properties 5 --ticks 10
+        [--output results.json] [--compare baseline.json]
+"""
+# IMPORTS
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import sys
+import time
+from fleet_simulator import (HomieFleet)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from homie import (component)
+from homie.message_batcher import (DEFAULT_BATCH_SIZE, DEFAULT_BATCH_DELAY)
+
+# TYPES
+from typing import (Callable, List)
+
+# CONSTANTS
+DEFAULT_TIMEOUT = 120
+
+
+def topic_matches(subscription: str, topic: str) -> bool:
+    """Return True if the topic matches an MQTT subscription with + and # wildcards."""
+    if subscription == topic:
+        return True
+    patterns = subscription.split('/')
+    segments = topic.split('/')
+    for index, pattern in enumerate(patterns):
+        if pattern == '#':
+            return True
+        if index >= len(segments) or (pattern != '+' and pattern != segments[index]):
+            return False
+    return len(patterns) == len(segments)
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """Return the nearest-rank percentile of the values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(percent / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+class StandInBus:
+    # Just enough of the Home Assistant event bus for homie.component.async_setup
+    def __init__(self):
+        self.listeners = dict()
+
+    def async_listen_once(self, event_type: str, listener: Callable):
+        self.listeners[event_type] = listener
+
+
+class StandInServices:
+    # Just enough of the Home Assistant service registry for homie.component.async_setup
+    def __init__(self):
+        self.handlers = dict()
+
+    def async_register(self, domain: str, service: str, handler: Callable, schema=None):
+        self.handlers[(domain, service)] = handler
+
+
+class StandInStates:
+    # Just enough of the Home Assistant state machine for homie.component.async_setup
+    def __init__(self):
+        self.states = dict()
+
+    def async_set(self, entity_id: str, new_state, attributes: dict = None, force_update: bool = False):
+        self.states[entity_id] = (new_state, attributes)
+
+
+class StandInHass:
+    # Just enough of HomeAssistant for homie.component.async_setup
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.data = dict()
+        self.bus = StandInBus()
+        self.services = StandInServices()
+        self.states = StandInStates()
+
+    def async_add_job(self, target, *args):
+        if asyncio.iscoroutine(target):
+            return self.loop.create_task(target)
+        if asyncio.iscoroutinefunction(target):
+            return self.loop.create_task(target(*args))
+        return self.loop.call_soon(target, *args)
+
+
+class ThroughputBenchmark:
+    # Feeds a simulated fleet through homie.component.async_setup and records how fast it is modelled
+
+    def __init__(self, fleet: HomieFleet, conf: dict, timeout: float = DEFAULT_TIMEOUT):
+        self._fleet = fleet
+        self._conf = conf
+        self._timeout = timeout
+        self._loop = asyncio.new_event_loop()
+        self._hass = StandInHass(self._loop)
+        self._callback = None
+        self._exact_subscriptions = set()
+        self._wildcard_subscriptions = list()
+        self._filtered = 0
+        self._retained = dict()
+        self._setup_properties = 0
+        self._platform_loads = 0
+        self._duplicate_setups = 0
+        self._discovered_at = None
+        self._sent = dict()
+        self._latencies = list()
+
+        component.mqtt.async_subscribe = self._async_subscribe
+        component.async_load_platform = self._async_load_platform
+
+    async def _async_subscribe(self, hass, topic: str, msg_callback: Callable, qos: int = 0, encoding: str = 'utf-8'):
+        # Stands in for the broker side filtering of the subscriptions
+        self._callback = msg_callback
+        if '+' in topic or '#' in topic:
+            self._wildcard_subscriptions.append(topic)
+        else:
+            self._exact_subscriptions.add(topic)
+            # Like a broker, hand over the retained message of a topic that is subscribed late
+            if topic in self._retained:
+                self._deliver(topic, self._retained[topic])
+        return lambda: None
+
+    def _subscribed(self, topic: str) -> bool:
+        if topic in self._exact_subscriptions:
+            return True
+        return any(topic_matches(subscription, topic) for subscription in self._wildcard_subscriptions)
+
+    async def _async_load_platform(self, hass, domain: str, platform: str, discovered: dict, hass_config=None):
+        # Stands in for the platforms: bind to each property and mark it setup
+        self._platform_loads += 1
+        for entity_id in discovered[component.KEY_HOMIE_ENTITY_IDS]:
+            homie_property = hass.data[component.KEY_HOMIE_ALREADY_DISCOVERED][entity_id]
+            homie_property.setup_requested = False
+            if homie_property.is_setup:
+                self._duplicate_setups += 1
+                continue
+            homie_property.is_setup = True
+            homie_property.add_listener(self._on_value_change)
+            self._setup_properties += 1
+        if self._setup_properties == self._fleet.property_count:
+            self._discovered_at = time.perf_counter()
+
+    def _on_value_change(self, source, attribute: str, old_value, new_value):
+        if attribute != 'value':
+            return
+        sent = self._sent.pop(source._prefix_topic, None)
+        if sent is not None:
+            self._latencies.append(time.perf_counter() - sent)
+
+    def _deliver(self, topic: str, payload: str):
+        # The MQTT component schedules the subscription callback as a job per message
+        if not self._subscribed(topic):
+            self._filtered += 1
+            self._sent.pop(topic, None)
+            return
+        self._hass.async_add_job(self._callback, topic, payload, 0)
+
+    def _run_until(self, predicate: Callable[[], bool]):
+        async def wait():
+            while not predicate():
+                await asyncio.sleep(0.0005)
+        self._loop.run_until_complete(asyncio.wait_for(wait(), self._timeout))
+
+    def run(self, ticks: int, value_fraction: float) -> dict:
+        """Run the retained burst followed by the periodic ticks and return the results."""
+        self._loop.run_until_complete(component.async_setup(self._hass, {component.DOMAIN: self._conf}))
+
+        # Retained burst, as dumped by the broker on subscribe
+        burst = list(self._fleet.retained_messages())
+        self._retained = dict(burst)
+        started = time.perf_counter()
+        for topic, payload in burst:
+            self._deliver(topic, payload)
+        self._run_until(lambda: self._discovered_at is not None)
+        discovery_seconds = self._discovered_at - started
+
+        # Periodic $stats and value traffic
+        steady_messages = 0
+        steady_seconds = 0.0
+        for tick in range(1, ticks + 1):
+            values = self._fleet.value_messages(tick, value_fraction)
+            messages = self._fleet.stats_messages(tick) + values
+            started = time.perf_counter()
+            for topic, payload in messages:
+                if topic.endswith('/value'):
+                    self._sent[topic] = time.perf_counter()
+                self._deliver(topic, payload)
+            self._run_until(lambda: not self._sent)
+            steady_seconds += time.perf_counter() - started
+            steady_messages += len(messages)
+
+        # The component's own per stage counters
+        self._hass.services.handlers[(component.DOMAIN, component.SERVICE_DIAGNOSTICS)](None)
+        _, diagnostics = self._hass.states.states[component.DIAGNOSTICS_ENTITY_ID]
+
+        self._loop.close()
+        latencies_ms = [latency * 1000 for latency in self._latencies]
+        return {
+            'fleet': {
+                'devices': self._fleet.device_count,
+                'nodes': self._fleet.node_count,
+                'properties': self._fleet.property_count,
+            },
+            'config': self._conf,
+            'burst_messages': len(burst),
+            'discovery_seconds': discovery_seconds,
+            'burst_messages_per_second': len(burst) / discovery_seconds,
+            'platform_loads': self._platform_loads,
+            'subscriptions': len(self._exact_subscriptions) + len(self._wildcard_subscriptions),
+            'filtered_by_broker': self._filtered,
+            'duplicate_setups': self._duplicate_setups,
+            'steady_messages': steady_messages,
+            'steady_messages_per_second': steady_messages / steady_seconds if steady_seconds else 0.0,
+            'latency_ms': {
+                'p50': percentile(latencies_ms, 50),
+                'p90': percentile(latencies_ms, 90),
+                'p99': percentile(latencies_ms, 99),
+                'max': max(latencies_ms, default=0.0),
+            },
+            'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            'diagnostics': diagnostics,
+            'python': platform.python_version(),
+        }
+
+
+def compare(results: dict, baseline: dict, prefix: str = ''):
+    """Print the relative change of every numeric result against a baseline."""
+    for key, value in results.items():
+        if isinstance(value, dict) and isinstance(baseline.get(key), dict):
+            compare(value, baseline[key], f'{prefix}{key}.')
+        elif isinstance(value, (int, float)) and isinstance(baseline.get(key), (int, float)) and baseline[key]:
+            change = (value - baseline[key]) / baseline[key] * 100
+            print(f'{prefix}{key:<32} {baseline[key]:>14,.3f} -> {value:>14,.3f} ({change:+.1f}%)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--devices', type=int, default=200)
+    parser.add_argument('--nodes', type=int, default=4)
+    parser.add_argument('--properties', type=int, default=5)
+    parser.add_argument('--ticks', type=int, default=10)
+    parser.add_argument('--value-fraction', type=float, default=0.5, help='Share of value properties changing per tick')
+    parser.add_argument('--batch-size', type=int, help=f'Defaults to {DEFAULT_BATCH_SIZE}, not with --ingestion-worker')
+    parser.add_argument('--batch-delay', type=float, help=f'Defaults to {DEFAULT_BATCH_DELAY}, not with --ingestion-worker')
+    parser.add_argument('--subscription-mode', choices=component.SUBSCRIPTION_MODES, default=component.SUBSCRIPTION_WILDCARD)
+    parser.add_argument('--ingestion-worker', action='store_true', help='Tokenize messages on a worker thread')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    parser.add_argument('--compare', help='Compare the results against a previous JSON result file')
+    args = parser.parse_args()
+
+    fleet = HomieFleet(args.devices, args.nodes, args.properties)
+    conf = {
+        component.CONF_SUBSCRIPTION_MODE: args.subscription_mode,
+        component.CONF_DISCOVERY_CACHE: False,
+        component.CONF_INGESTION_WORKER: args.ingestion_worker,
+    }
+    if args.batch_size is not None:
+        conf[component.CONF_BATCH_SIZE] = args.batch_size
+    if args.batch_delay is not None:
+        conf[component.CONF_BATCH_DELAY] = args.batch_delay
+    conf = component.CONFIG_SCHEMA({component.DOMAIN: conf})[component.DOMAIN]
+    results = ThroughputBenchmark(fleet, conf).run(args.ticks, args.value_fraction)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+    if args.compare:
+        with open(args.compare) as baseline:
+            compare(results, json.load(baseline))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+# IMPORT
+import asyncio
+import logging
+
+from homeassistant.components.binary_sensor import (BinarySensorDevice)
+from custom_components.homie.entity import (HomieEntity, setup_homie_entities)
+
+# TYPINGS
+from homeassistant.helpers.typing import (HomeAssistantType, ConfigType)
+
+# CONSTANTS
+_LOGGER = logging.getLogger(__name__)
+
+@asyncio.coroutine
+def async_setup_platform(hass: HomeAssistantType, config: ConfigType, async_add_entities, discovery_info=None):
+    """Set up the Homie binary sensor."""
+    _LOGGER.info(f"Setting up Homie Binary Sensor: {config} - {discovery_info}")
+    setup_homie_entities(hass, discovery_info, async_add_entities, HomieBinarySensor)
+    return None
+
+
+class HomieBinarySensor(HomieEntity, BinarySensorDevice):
+    """Implementation of a Homie Binary Sensor."""
+
+    @property
+    def is_on(self):
+        """Return true if the Homie Binary Sensor is on."""
+        return self._property.value is True
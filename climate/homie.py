@@ -0,0 +1,66 @@
+# IMPORT
+import asyncio
+import logging
+
+from homeassistant.components.climate import (ClimateDevice, SUPPORT_TARGET_TEMPERATURE)
+from homeassistant.const import (ATTR_TEMPERATURE, TEMP_CELSIUS, TEMP_FAHRENHEIT)
+from custom_components.homie.entity import (HomieEntity, setup_homie_entities)
+from custom_components.homie.payload_decoder import (DATATYPE_INTEGER)
+
+# TYPINGS
+from homeassistant.helpers.typing import (HomeAssistantType, ConfigType)
+
+# CONSTANTS
+_LOGGER = logging.getLogger(__name__)
+FAHRENHEIT_UNITS = ('°F', 'F')
+
+@asyncio.coroutine
+def async_setup_platform(hass: HomeAssistantType, config: ConfigType, async_add_entities, discovery_info=None):
+    """Set up the Homie climate device."""
+    _LOGGER.info(f"Setting up Homie Climate: {config} - {discovery_info}")
+    setup_homie_entities(hass, discovery_info, async_add_entities, HomieClimate)
+    return None
+
+
+class HomieClimate(HomieEntity, ClimateDevice):
+    """Implementation of a Homie Climate device, bound to its target temperature Property."""
+
+    @property
+    def supported_features(self):
+        """Flag supported features."""
+        return SUPPORT_TARGET_TEMPERATURE
+
+    @property
+    def temperature_unit(self):
+        """Return the unit of measurement of the Homie Property."""
+        return TEMP_FAHRENHEIT if self._property.unit in FAHRENHEIT_UNITS else TEMP_CELSIUS
+
+    @property
+    def current_temperature(self):
+        """Return the current temperature, Homie only reports the target."""
+        return None
+
+    @property
+    def target_temperature(self):
+        """Return the temperature the Homie device is set to."""
+        return self._property.value
+
+    @property
+    def min_temp(self):
+        """Return the lowest settable temperature."""
+        bounds = self._property.range
+        return bounds[0] if bounds else super().min_temp
+
+    @property
+    def max_temp(self):
+        """Return the highest settable temperature."""
+        bounds = self._property.range
+        return bounds[1] if bounds else super().max_temp
+
+    @asyncio.coroutine
+    def async_set_temperature(self, **kwargs):
+        """Set a new target temperature, the state is optimistic until the device confirms it."""
+        temperature = kwargs.get(ATTR_TEMPERATURE)
+        if temperature is None:
+            return
+        self._property.set_value(round(temperature) if self._property.datatype == DATATYPE_INTEGER else temperature)
@@ -1,5 +0,0 @@
-# TYPES
-from typing import (Dict)
-from .mqtt_message import MQTTMessage
-
-MessageQue = Dict[str, MQTTMessage]
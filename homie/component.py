@@ -0,0 +1,349 @@
+# IMPORTS
+import asyncio
+import datetime
+import json
+import logging
+import time
+import voluptuous as vol
+import homeassistant.components.mqtt as mqtt
+from homeassistant.components.mqtt import (CONF_DISCOVERY_PREFIX, CONF_QOS, valid_discovery_topic, _VALID_QOS_SCHEMA)
+from homeassistant.helpers.discovery import (async_load_platform)
+from homeassistant.helpers.event import (async_track_time_interval)
+from homeassistant.helpers.storage import (Store)
+from homeassistant.helpers import (config_validation as cv)
+from homeassistant.const import (EVENT_HOMEASSISTANT_STOP)
+from homeassistant.util import (slugify)
+from . import (DOMAIN, KEY_HOMIE_ALREADY_DISCOVERED, KEY_HOMIE_ENTITY_IDS, KEY_HOMIE_PLATFORM, KEY_HOMIE_DEVICE_ENTITIES,
+               KEY_HOMIE_ENTITIES)
+from .homie_classes import (HomieProperty)
+from .homie_parser import (SUPPORTED_VERSIONS)
+from .retained_store import (EVICTION_POLICIES, DEFAULT_MAX_SIZE, DEFAULT_EVICTION)
+from .platform_mapping import (platform_for)
+from .discovery_cache import (CACHE_VERSION)
+from .manager import (HomieManager, DEFAULT_DISCOVERY_PREFIX)
+from .ingestion_worker import (DEFAULT_QUEUE_SIZE)
+from .liveness import (DEFAULT_TIMEOUT_MULTIPLIER)
+from .value_filter import (ValueFilter, ValueFilters)
+from .outbound_queue import (DEFAULT_COALESCE_WINDOW, DEFAULT_RATE_LIMIT)
+from .diagnostics import (STAGE_INGESTION, STAGE_PLATFORM_SETUP)
+
+# TYPES
+from typing import (Dict)
+from homeassistant.helpers.typing import (HomeAssistantType, ConfigType)
+
+# CONSTANTS
+HOMIE_SUPPORTED_VERSIONS = SUPPORTED_VERSIONS
+DEFAULT_QOS = 0
+CONF_RETAINED_SIZE = 'retained_size'
+CONF_RETAINED_EVICTION = 'retained_eviction'
+CONF_BATCH_SIZE = 'batch_size'
+CONF_BATCH_DELAY = 'batch_delay'
+CONF_SET_COALESCE_WINDOW = 'set_coalesce_window'
+CONF_SET_RATE_LIMIT = 'set_rate_limit'
+CONF_SUBSCRIPTION_MODE = 'subscription_mode'
+SUBSCRIPTION_WILDCARD = 'wildcard'
+SUBSCRIPTION_NARROW = 'narrow'
+SUBSCRIPTION_MODES = [SUBSCRIPTION_WILDCARD, SUBSCRIPTION_NARROW]
+# Narrow mode only subscribes the low rate topics discovery needs, property values are subscribed per entity
+DISCOVERY_SUBSCRIPTIONS = [
+    '+/+',  # Device attributes, $homie included
+    '+/$stats/+',
+    '+/$fw/+',
+    '+/+/$type',
+    '+/+/$name',
+    # Property attributes first, the retained ones are then known when $properties discovers their properties
+    '+/+/+/$name',
+    '+/+/+/$settable',
+    '+/+/+/$datatype',
+    '+/+/+/$format',
+    '+/+/+/$unit',
+    '+/+/$properties',
+]
+CONF_DISCOVERY_CACHE = 'discovery_cache'
+CONF_DISCOVERY_CACHE_INTERVAL = 'discovery_cache_interval'
+DEFAULT_DISCOVERY_CACHE_INTERVAL = 60
+STORAGE_KEY = f'{DOMAIN}.discovery'
+# Further base topics, e.g. one per site, each with its own registry, router and stats
+CONF_DISCOVERY_PREFIXES = 'discovery_prefixes'
+CONF_INGESTION_WORKER = 'ingestion_worker'
+CONF_INGESTION_QUEUE_SIZE = 'ingestion_queue_size'
+CONF_STATS_TIMEOUT_MULTIPLIER = 'stats_timeout_multiplier'
+CONF_VALUE_FILTER = 'value_filter'
+CONF_PROPERTY_FILTERS = 'property_filters'
+CONF_TOPIC = 'topic'
+CONF_CHANGE_ONLY = 'change_only'
+CONF_DEADBAND = 'deadband'
+CONF_DEADBAND_PERCENT = 'deadband_percent'
+CONF_MIN_INTERVAL = 'min_interval'
+CONF_DIAGNOSTICS_INTERVAL = 'diagnostics_interval'
+DEFAULT_DIAGNOSTICS_INTERVAL = 0
+SERVICE_DIAGNOSTICS = 'diagnostics'
+DIAGNOSTICS_ENTITY_ID = f'{DOMAIN}.diagnostics'
+
+# CONFIg
+def _disjoint_prefixes(conf: ConfigType) -> ConfigType:
+    # A base topic nested in another would have its messages handled twice
+    prefixes = [conf[CONF_DISCOVERY_PREFIX]] + conf[CONF_DISCOVERY_PREFIXES]
+    for index, prefix in enumerate(prefixes):
+        for other in prefixes[index + 1:]:
+            if prefix == other or other.startswith(f'{prefix}/') or prefix.startswith(f'{other}/'):
+                raise vol.Invalid(f"Discovery prefix {other} overlaps with {prefix}")
+    return conf
+
+
+def _worker_without_batches(conf: ConfigType) -> ConfigType:
+    # The worker hands over its own batches, the batcher is bypassed
+    if conf[CONF_INGESTION_WORKER] and (CONF_BATCH_SIZE in conf or CONF_BATCH_DELAY in conf):
+        raise vol.Invalid(f"{CONF_BATCH_SIZE} and {CONF_BATCH_DELAY} can not be used with {CONF_INGESTION_WORKER}")
+    return conf
+
+
+VALUE_FILTER_SCHEMA = {
+    vol.Optional(CONF_CHANGE_ONLY, default=True): cv.boolean,
+    vol.Optional(CONF_DEADBAND, default=0): vol.All(vol.Coerce(float), vol.Range(min=0)),
+    vol.Optional(CONF_DEADBAND_PERCENT, default=0): vol.All(vol.Coerce(float), vol.Range(min=0)),
+    vol.Optional(CONF_MIN_INTERVAL, default=0): vol.All(vol.Coerce(float), vol.Range(min=0)),
+}
+
+CONFIG_SCHEMA = vol.Schema({
+    DOMAIN: vol.All(vol.Schema({
+        vol.Optional(CONF_DISCOVERY_PREFIX, default=DEFAULT_DISCOVERY_PREFIX): valid_discovery_topic,
+        vol.Optional(CONF_DISCOVERY_PREFIXES, default=[]): vol.All(cv.ensure_list, [valid_discovery_topic]),
+        vol.Optional(CONF_QOS, default=DEFAULT_QOS): _VALID_QOS_SCHEMA,
+        vol.Optional(CONF_RETAINED_SIZE, default=DEFAULT_MAX_SIZE): vol.All(cv.positive_int, vol.Range(min=1)),
+        vol.Optional(CONF_RETAINED_EVICTION, default=DEFAULT_EVICTION): vol.In(EVICTION_POLICIES),
+        # Defaults to DEFAULT_BATCH_SIZE and DEFAULT_BATCH_DELAY, unless the ingestion worker is on
+        vol.Optional(CONF_BATCH_SIZE): cv.positive_int,
+        vol.Optional(CONF_BATCH_DELAY): vol.All(vol.Coerce(float), vol.Range(min=0)),
+        vol.Optional(CONF_SET_COALESCE_WINDOW, default=DEFAULT_COALESCE_WINDOW): vol.All(vol.Coerce(float), vol.Range(min=0)),
+        vol.Optional(CONF_SET_RATE_LIMIT, default=DEFAULT_RATE_LIMIT): vol.All(vol.Coerce(float), vol.Range(min=0)),
+        vol.Optional(CONF_SUBSCRIPTION_MODE, default=SUBSCRIPTION_WILDCARD): vol.In(SUBSCRIPTION_MODES),
+        vol.Optional(CONF_DISCOVERY_CACHE, default=True): cv.boolean,
+        vol.Optional(CONF_DISCOVERY_CACHE_INTERVAL, default=DEFAULT_DISCOVERY_CACHE_INTERVAL): vol.All(cv.positive_int, vol.Range(min=1)),
+        # The worker thread only tokenizes topics and coalesces repeats, routing, decoding and discovery stay on
+        # the event loop. It replaces the batcher, so batch_size and batch_delay are rejected with it.
+        vol.Optional(CONF_INGESTION_WORKER, default=False): cv.boolean,
+        vol.Optional(CONF_INGESTION_QUEUE_SIZE, default=DEFAULT_QUEUE_SIZE): vol.All(cv.positive_int, vol.Range(min=1)),
+        vol.Optional(CONF_STATS_TIMEOUT_MULTIPLIER, default=DEFAULT_TIMEOUT_MULTIPLIER): vol.All(vol.Coerce(float), vol.Range(min=1)),
+        vol.Optional(CONF_VALUE_FILTER, default={}): vol.Schema(VALUE_FILTER_SCHEMA),
+        # <device>/<node>/<property> with + and # wildcards, the first matching filter applies
+        vol.Optional(CONF_PROPERTY_FILTERS, default=[]): vol.All(cv.ensure_list, [vol.Schema({
+            vol.Required(CONF_TOPIC): cv.string,
+            **VALUE_FILTER_SCHEMA,
+        })]),
+        vol.Optional(CONF_DIAGNOSTICS_INTERVAL, default=DEFAULT_DIAGNOSTICS_INTERVAL): cv.positive_int,
+    }), _disjoint_prefixes, _worker_without_batches),
+}, extra=vol.ALLOW_EXTRA)
+
+# GLOBALS
+_LOGGER = logging.getLogger(__name__)
+
+
+@asyncio.coroutine
+def async_setup(hass: HomeAssistantType, config: ConfigType):
+    """Setup the Homie service."""
+    # Init
+    _PENDING_PROPERTIES = set()
+    _work_scheduled = False
+    _SUBSCRIPTIONS = dict()
+    hass.data[KEY_HOMIE_ALREADY_DISCOVERED] = dict()
+    hass.data[KEY_HOMIE_DEVICE_ENTITIES] = dict()
+    hass.data[KEY_HOMIE_ENTITIES] = dict()
+    # The platform each Property was last submitted to
+    _PLATFORMS = dict()
+
+    # Config
+    conf = config.get(DOMAIN)
+    if conf is None:
+        conf = CONFIG_SCHEMA({DOMAIN: {}})[DOMAIN]
+    discovery_prefix = conf.get(CONF_DISCOVERY_PREFIX)
+    qos = conf.get(CONF_QOS)
+    subscription_mode = conf.get(CONF_SUBSCRIPTION_MODE)
+
+    # Which values of a Property are worth a state write
+    def value_filter(filter_conf: ConfigType):
+        return ValueFilter(filter_conf.get(CONF_CHANGE_ONLY), filter_conf.get(CONF_DEADBAND),
+                           filter_conf.get(CONF_DEADBAND_PERCENT), filter_conf.get(CONF_MIN_INTERVAL))
+
+    value_filters = ValueFilters(value_filter(conf.get(CONF_VALUE_FILTER)),
+                                 [(rule.get(CONF_TOPIC), value_filter(rule)) for rule in conf.get(CONF_PROPERTY_FILTERS)])
+
+    # The engine, Home Assistant only provides the MQTT transport, the storage and the entities
+    def queue_property(property: HomieProperty):
+        # Requested properties are rechecked once their entity is set up, entities stay unless their platform changed
+        if property.setup_requested:
+            return
+        if property.is_setup and platform_for(property.node.type, property.datatype, property.settable) == _PLATFORMS.get(property):
+            return
+        _PENDING_PROPERTIES.add(property)
+        schedule_work()
+
+    def publish_message(topic: str, payload: str):
+        mqtt.async_publish(hass, topic, payload, qos, False)
+
+    _MANAGER = HomieManager(hass.loop, [discovery_prefix] + conf.get(CONF_DISCOVERY_PREFIXES), publish_message,
+                            queue_property, value_filters,
+                            conf.get(CONF_SET_COALESCE_WINDOW), conf.get(CONF_SET_RATE_LIMIT),
+                            retained_size=conf.get(CONF_RETAINED_SIZE),
+                            retained_eviction=conf.get(CONF_RETAINED_EVICTION), batch_size=conf.get(CONF_BATCH_SIZE),
+                            batch_delay=conf.get(CONF_BATCH_DELAY), ingestion_worker=conf.get(CONF_INGESTION_WORKER),
+                            ingestion_queue_size=conf.get(CONF_INGESTION_QUEUE_SIZE),
+                            stats_timeout_multiplier=conf.get(CONF_STATS_TIMEOUT_MULTIPLIER),
+                            cached=conf.get(CONF_DISCOVERY_CACHE))
+
+    # The adapter's own gauges are reported with the engine's
+    _DIAGNOSTICS = _MANAGER.diagnostics
+    _DIAGNOSTICS.add_gauge('subscriptions', lambda: len(_SUBSCRIPTIONS))
+    _DIAGNOSTICS.add_gauge('pending_properties', lambda: len(_PENDING_PROPERTIES))
+
+    def report_diagnostics(*args):
+        snapshot = _DIAGNOSTICS.snapshot()
+        _LOGGER.info(f"Homie Diagnostics: {json.dumps(snapshot, sort_keys=True)}")
+        ingested = sum(site['stages'][STAGE_INGESTION]['items'] for site in snapshot['prefixes'].values())
+        hass.states.async_set(DIAGNOSTICS_ENTITY_ID, ingested, snapshot)
+
+    hass.services.async_register(DOMAIN, SERVICE_DIAGNOSTICS, report_diagnostics)
+    diagnostics_interval = conf.get(CONF_DIAGNOSTICS_INTERVAL)
+    _DiagnosticsTask = None
+    if diagnostics_interval:
+        _DiagnosticsTask = async_track_time_interval(hass, report_diagnostics, datetime.timedelta(0, diagnostics_interval))
+
+    # Discovery Cache, one store per site, the topology and last values are restored before the broker replays its retained topics
+    _STORES = dict()
+    _CacheTask = None
+    if conf.get(CONF_DISCOVERY_CACHE):
+        for prefix in _MANAGER.sites:
+            key = STORAGE_KEY if prefix == discovery_prefix else f"{STORAGE_KEY}.{prefix.replace('/', '_')}"
+            _STORES[prefix] = Store(hass, CACHE_VERSION, key)
+
+    def save_cache(*args):
+        for prefix, store in _STORES.items():
+            site = _MANAGER.sites[prefix]
+            if site.cache_dirty:
+                hass.async_add_job(store.async_save(site.cache_snapshot()))
+
+    @asyncio.coroutine
+    def async_restore_cache():
+        for prefix, store in _STORES.items():
+            _MANAGER.sites[prefix].restore_cache((yield from store.async_load()))
+
+    if _STORES:
+        _CacheTask = async_track_time_interval(hass, save_cache, datetime.timedelta(0, conf.get(CONF_DISCOVERY_CACHE_INTERVAL)))
+
+    # Proccess Task, only scheduled when there is pending work
+    def schedule_work():
+        nonlocal _work_scheduled
+        if not _work_scheduled:
+            _work_scheduled = True
+            hass.async_add_job(async_process_work())
+
+    @asyncio.coroutine
+    def async_process_work():
+        nonlocal _work_scheduled
+        _work_scheduled = False
+        yield from async_setup_device_components()
+
+    # Destroy Homie
+    @asyncio.coroutine
+    def async_destroy(event):
+        if _DiagnosticsTask: _DiagnosticsTask()
+        if _CacheTask: _CacheTask()
+        for prefix, store in _STORES.items():
+            yield from store.async_save(_MANAGER.sites[prefix].cache_snapshot())
+        _MANAGER.stop()
+        for unsubscribe in _SUBSCRIPTIONS.values():
+            if unsubscribe: unsubscribe()
+        _SUBSCRIPTIONS.clear()
+
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_destroy)
+
+    # Sart
+    @asyncio.coroutine
+    def async_start():
+        for prefix in _MANAGER.sites:
+            _LOGGER.info(f"Component - {DOMAIN} - Start. Discovery Topic: {prefix}/, Subscriptions: {subscription_mode}")
+            if subscription_mode == SUBSCRIPTION_NARROW:
+                for topic in DISCOVERY_SUBSCRIPTIONS:
+                    yield from async_subscribe_topic(f'{prefix}/{topic}')
+            else:
+                yield from async_subscribe_topic(f'{prefix}/#')
+
+    @asyncio.coroutine
+    def async_subscribe_topic(topic: str):
+        if topic not in _SUBSCRIPTIONS:
+            _SUBSCRIPTIONS[topic] = yield from mqtt.async_subscribe(hass, topic, async_device_message_received, qos)
+
+    @asyncio.coroutine
+    def async_device_message_received(topic: str, payload: str, qos: int):
+        _MANAGER.feed(topic, payload, qos)
+
+    # Entities
+    def property_entity_id(property: HomieProperty):
+        # The object id of the entity, <device>_<node>_<property> whatever its $name
+        # Further sites are namespaced by their base topic, the same device id may exist on every site
+        entity_id = f"{property.node.device.device_id}_{property.node.node_id}_{property.property_id}"
+        prefix = property.node.device.base_topic
+        if prefix != discovery_prefix:
+            entity_id = f"{prefix}_{entity_id}"
+        return slugify(entity_id)
+
+    @asyncio.coroutine
+    def async_setup_device_components():
+        # TODO: create device sneosors for stats
+
+        # One entity per Property, grouped so each platform is loaded once per pass
+        platform_properties = dict()
+        moved_entity_ids = list()
+        pending_properties = list(_PENDING_PROPERTIES)
+        _PENDING_PROPERTIES.clear()
+        for property in pending_properties:
+            if property.setup_requested:
+                continue
+            platform = platform_for(property.node.type, property.datatype, property.settable)
+            entity_id = property_entity_id(property)
+            if property.is_setup:
+                if platform == _PLATFORMS.get(property):
+                    continue
+                # Its $datatype or $settable arrived after the entity was created, it moves to the platform they map to
+                _LOGGER.info(f"Homie Property {property._prefix_topic} moves from {_PLATFORMS.get(property)} to {platform}")
+                moved_entity_ids.append(entity_id)
+                property.is_setup = False
+            _PLATFORMS[property] = platform
+            if platform is None:
+                _LOGGER.debug(f"Homie Property {property._prefix_topic} has no platform, no entity is created")
+            else:
+                platform_properties.setdefault(platform, dict())[entity_id] = property
+
+        # Properties stay requested until the platform sets them up, all of them before the first yield so a pass
+        # started meanwhile can not submit them again
+        for properties in platform_properties.values():
+            for entity_id, property in properties.items():
+                property.setup_requested = True
+                hass.data[KEY_HOMIE_ALREADY_DISCOVERED][entity_id] = property
+
+        for entity_id in moved_entity_ids:
+            entity = hass.data[KEY_HOMIE_ENTITIES].get(entity_id)
+            if entity is not None:
+                yield from entity.async_remove()
+
+        for platform, properties in platform_properties.items():
+            yield from setup_properties_as_platform(properties, platform)
+
+    @asyncio.coroutine
+    def setup_properties_as_platform(properties: Dict[str, HomieProperty], platform: str):
+        discovery_info = {KEY_HOMIE_ENTITY_IDS: list(properties), KEY_HOMIE_PLATFORM: platform}
+        start = time.perf_counter()
+        yield from async_load_platform(hass, platform, DOMAIN, discovery_info)
+        _DIAGNOSTICS.record(STAGE_PLATFORM_SETUP, time.perf_counter() - start, len(properties))
+
+        # Only values that have an entity are worth receiving
+        if subscription_mode == SUBSCRIPTION_NARROW:
+            for property in properties.values():
+                yield from async_subscribe_topic(property._prefix_topic)
+
+
+    if _STORES:
+        yield from async_restore_cache()
+    _MANAGER.start()
+    yield from async_start()
+    return True
@@ -0,0 +1,74 @@
+# IMPORTS
+import bisect
+import logging
+
+# TYPES
+from typing import (Callable, Dict)
+
+# CONSTANTS
+STAGE_INGESTION = 'ingestion'
+STAGE_MODEL_UPDATE = 'model_update'
+STAGE_DISCOVERY = 'discovery'
+STAGE_PLATFORM_SETUP = 'platform_setup'
+STAGES = [STAGE_INGESTION, STAGE_MODEL_UPDATE, STAGE_DISCOVERY, STAGE_PLATFORM_SETUP]
+BUCKET_BOUNDS_MS = [0.01, 0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000]
+
+# GLOBALS
+_LOGGER = logging.getLogger(__name__)
+
+
+class TimingHistogram:
+    # Counts and timings of one stage, bucketed by duration
+    __slots__ = ('_count', '_items', '_total', '_max', '_buckets')
+
+    def __init__(self):
+        self._count = 0
+        self._items = 0
+        self._total = 0.0
+        self._max = 0.0
+        self._buckets = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+
+    def record(self, seconds: float, items: int = 1):
+        """Record one run of the stage that handled a number of items."""
+        milliseconds = seconds * 1000
+        self._count += 1
+        self._items += items
+        self._total += milliseconds
+        if milliseconds > self._max:
+            self._max = milliseconds
+        self._buckets[bisect.bisect_left(BUCKET_BOUNDS_MS, milliseconds)] += 1
+
+    def snapshot(self) -> Dict:
+        """Return the counters of the stage."""
+        buckets = {f'le_{bound}ms': count for bound, count in zip(BUCKET_BOUNDS_MS, self._buckets)}
+        buckets['le_inf'] = self._buckets[-1]
+        return {
+            'count': self._count,
+            'items': self._items,
+            'total_ms': round(self._total, 3),
+            'mean_ms': round(self._total / self._count, 3) if self._count else 0.0,
+            'max_ms': round(self._max, 3),
+            'buckets': buckets,
+        }
+
+
+class HomieDiagnostics:
+    # Per stage timing counters plus gauges that are only computed when a snapshot is taken
+
+    def __init__(self):
+        self._stages = {stage: TimingHistogram() for stage in STAGES}
+        self._gauges = dict()
+
+    def record(self, stage: str, seconds: float, items: int = 1):
+        """Record one run of a stage."""
+        self._stages[stage].record(seconds, items)
+
+    def add_gauge(self, name: str, gauge: Callable[[], int]):
+        """Add a value that is read whenever a snapshot is taken."""
+        self._gauges[name] = gauge
+
+    def snapshot(self) -> Dict:
+        """Return the gauges and the counters of every stage."""
+        result = {name: gauge() for name, gauge in self._gauges.items()}
+        result['stages'] = {stage: histogram.snapshot() for stage, histogram in self._stages.items()}
+        return result
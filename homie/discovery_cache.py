@@ -0,0 +1,45 @@
+# IMPORTS
+import logging
+from .homie_classes import (HomieDevice)
+from .retained_store import (RetainedStore)
+
+# TYPES
+from typing import (Dict, Iterable, List, Tuple)
+
+# CONSTANTS
+CACHE_VERSION = 1
+KEY_PREFIX = 'prefix'
+KEY_DEVICES = 'devices'
+
+# GLOBALS
+_LOGGER = logging.getLogger(__name__)
+
+
+def snapshot_devices(prefix: str, devices: Iterable[HomieDevice], store: RetainedStore) -> Dict:
+    """Return the topology and last known values of the devices, as the last payload of every topic they own."""
+    cached_devices = dict()
+    for device in devices:
+        prefix_topic = device._prefix_topic
+        prefix_length = len(prefix_topic) + 1
+        # Topics are kept relative to their device, the device id and prefix are only stored once
+        cached_devices[device.device_id] = {topic[prefix_length:]: message.payload
+                                            for topic, message in store.under(prefix_topic) if topic != prefix_topic}
+    return {KEY_PREFIX: prefix, KEY_DEVICES: cached_devices}
+
+
+def restore_messages(prefix: str, data: Dict) -> List[Tuple[str, str]]:
+    """Return the (topic, payload) messages of a snapshot, announcements first so devices are discovered before their topics arrive."""
+    if not data or data.get(KEY_PREFIX) != prefix:
+        return list()
+
+    announcements = list()
+    messages = list()
+    for device_id, topics in data.get(KEY_DEVICES, dict()).items():
+        for subtopic, payload in topics.items():
+            message = (f'{prefix}/{device_id}/{subtopic}', payload)
+            if subtopic == '$homie':
+                announcements.append(message)
+            else:
+                messages.append(message)
+    _LOGGER.info(f"Restoring {len(announcements)} Homie Devices from the discovery cache")
+    return announcements + messages
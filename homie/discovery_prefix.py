@@ -0,0 +1,237 @@
+# IMPORTS
+import asyncio
+import logging
+import time
+from .mqtt_message import (MQTTMessage)
+from .homie_classes import (HomieDevice, Publisher)
+from .homie_parser import (parser_for)
+from .topic_router import (TopicRouter)
+from .topic_tokenizer import (TopicTokenizer, TopicTokens, TOPIC_DEVICE_ATTRIBUTE, TOPIC_SET)
+from .retained_store import (RetainedStore, DEFAULT_MAX_SIZE, DEFAULT_EVICTION)
+from .message_batcher import (MessageBatcher, DEFAULT_BATCH_SIZE, DEFAULT_BATCH_DELAY)
+from .discovery_cache import (snapshot_devices, restore_messages)
+from .ingestion_worker import (IngestionWorker, DEFAULT_QUEUE_SIZE)
+from .liveness import (LivenessWheel, DEFAULT_TIMEOUT_MULTIPLIER)
+from .diagnostics import (HomieDiagnostics, STAGE_INGESTION, STAGE_MODEL_UPDATE, STAGE_DISCOVERY)
+
+# TYPES
+from typing import (Callable, Dict, List, Optional, Tuple)
+
+Devices = Dict[str, HomieDevice]
+
+# CONSTANTS
+ANNOUNCEMENT_ATTRIBUTE = '$homie'
+# Restored devices the broker has not confirmed this long after its first message are left out of the cache
+RECONCILE_DELAY = 60
+
+# GLOBALS
+_LOGGER = logging.getLogger(__name__)
+
+
+class DiscoveryPrefix:
+    # One Homie base topic with its own registry, router, queues and stats, so a site never pays for another site's traffic
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, prefix: str, publisher: Publisher,
+                 device_discovered: Callable[[HomieDevice], None],
+                 retained_size: int = DEFAULT_MAX_SIZE, retained_eviction: str = DEFAULT_EVICTION,
+                 batch_size: Optional[int] = None, batch_delay: Optional[float] = None,
+                 ingestion_worker: bool = False, ingestion_queue_size: int = DEFAULT_QUEUE_SIZE,
+                 stats_timeout_multiplier: float = DEFAULT_TIMEOUT_MULTIPLIER, cached: bool = False):
+        self._loop = loop
+        self._prefix = prefix
+        self._publisher = publisher
+        self._device_discovered = device_discovered
+
+        # The last message of every topic, late discovered objects are populated from it
+        self._retained = RetainedStore(retained_size, retained_eviction)
+
+        # Every topic is split and classified once, repeats are served from the cache
+        self._tokenizer = TopicTokenizer(prefix)
+        self._router = TopicRouter(self._retained, self._tokenizer)
+        self._devices = self._router.devices
+
+        # Optionally the messages are only tokenized on a worker thread, its batches bypass the batcher and everything
+        # else (routing, decoding, discovery) still runs on the loop
+        self._worker = None
+        if ingestion_worker:
+            if batch_size is not None or batch_delay is not None:
+                raise ValueError("batch_size and batch_delay do not apply to the ingestion worker")
+            self._worker = IngestionWorker(loop, self._tokenizer, self._apply_worker_batch, ingestion_queue_size)
+
+        # Bursts (e.g. the retained dump on (re)connect) are coalesced and applied in batches
+        self._batcher = MessageBatcher(loop, self._flush_messages,
+                                       DEFAULT_BATCH_SIZE if batch_size is None else batch_size,
+                                       DEFAULT_BATCH_DELAY if batch_delay is None else batch_delay)
+
+        # A device that misses its $stats/uptime for a few intervals is unavailable, one timer wheel for the site
+        self._stats_timeout_multiplier = stats_timeout_multiplier
+        self._liveness = LivenessWheel(loop, self._device_expired)
+
+        # Discovery cache bookkeeping, only the devices the broker confirmed are kept once reconciled
+        self._cached = cached
+        self._live_devices = set()
+        self._restored_devices = set()
+        self._cache_dirty = False
+        self._reconcile_timer = None
+        self._reconciled = False
+
+        # Per site gauges, nested under prefixes in the engine snapshot
+        self._diagnostics = HomieDiagnostics()
+        self._diagnostics.add_gauge('retained_topics', lambda: len(self._retained))
+        self._diagnostics.add_gauge('batch_pending', lambda: self._batcher.pending)
+        if self._worker is not None:
+            self._diagnostics.add_gauge('worker_pending', lambda: self._worker.pending)
+            self._diagnostics.add_gauge('worker', lambda: self._worker.stats)
+        self._diagnostics.add_gauge('tokenizer', lambda: self._tokenizer.stats)
+        self._diagnostics.add_gauge('devices', lambda: len(self._devices))
+        self._diagnostics.add_gauge('unavailable_devices', lambda: sum(1 for device in self._devices.values() if not device.available))
+        self._diagnostics.add_gauge('nodes', lambda: sum(len(device.nodes) for device in self._devices.values()))
+        self._diagnostics.add_gauge('properties', lambda: sum(len(node.properties) for device in self._devices.values() for node in device.nodes))
+
+    def start(self):
+        """Start the ingestion worker, if any."""
+        if self._worker is not None:
+            self._worker.start()
+
+    def cancel(self):
+        """Stop every timer and the ingestion worker."""
+        if self._reconcile_timer: self._reconcile_timer.cancel()
+        self._batcher.cancel()
+        self._liveness.cancel()
+        if self._worker is not None: self._worker.stop()
+        for device in self._devices.values():
+            for node in device.nodes:
+                for property in node.properties:
+                    property._cancel_pending()
+
+    # Ingestion
+    def flush(self):
+        """Apply the messages that are still waiting for their batch."""
+        self._batcher.flush()
+
+    def receive(self, topic: str, payload: str, qos: int):
+        """Accept a message from the broker, it is applied with the next batch."""
+        if self._worker is not None:
+            self._worker.put(topic, payload, qos)
+            return
+        start = time.perf_counter()
+        self._batcher.add(MQTTMessage(topic, payload, qos))
+        self._diagnostics.record(STAGE_INGESTION, time.perf_counter() - start)
+
+    def _flush_messages(self, messages: List[MQTTMessage]):
+        self.process_messages(messages, True)
+
+    def _apply_worker_batch(self, batch: List[Tuple[MQTTMessage, TopicTokens]], seconds: float):
+        self._diagnostics.record(STAGE_INGESTION, seconds, len(batch))
+        self.apply_messages(batch, True)
+
+    def process_messages(self, messages: List[MQTTMessage], live: bool):
+        """Tokenize and apply messages, live is False for messages that did not come from the broker."""
+        self.apply_messages([(message, self._tokenizer.tokenize(message.topic)) for message in messages], live)
+
+    def apply_messages(self, messages: List[Tuple[MQTTMessage, TopicTokens]], live: bool):
+        """Apply tokenized messages to the devices of the site."""
+        start = time.perf_counter()
+        for message, tokens in messages:
+            if tokens is None or tokens.kind == TOPIC_SET:
+                # Outside the Homie layout, or a command (our own included) that is not state
+                continue
+            self._retained.put(message.topic, message)
+            if live and tokens.device_id not in self._live_devices:
+                self._confirm_device(tokens.device_id)
+
+            # Route the message straight to the Device, Node or Property that owns its topic
+            owner = self._router.route(tokens)
+            if owner is not None:
+                owner._apply(tokens, message.payload)
+            elif tokens.kind == TOPIC_DEVICE_ATTRIBUTE and tokens.attribute == ANNOUNCEMENT_ATTRIBUTE:
+                self._discover_device(message, tokens)
+        if live and self._cached:
+            self._cache_dirty = True
+            if self._reconcile_timer is None:
+                self._reconcile_timer = self._loop.call_later(RECONCILE_DELAY, self._reconcile_cache)
+        self._diagnostics.record(STAGE_MODEL_UPDATE, time.perf_counter() - start, len(messages))
+
+    def _discover_device(self, message: MQTTMessage, tokens: TopicTokens):
+        device_id = tokens.device_id
+        if device_id not in self._devices:
+            # The parser is chosen once, from the version the device announces
+            parser = parser_for(message.payload)
+            if parser is None:
+                _LOGGER.debug(f"Ignoring Homie Device {device_id} with unsupported version {message.payload}")
+                return
+            start = time.perf_counter()
+            device = HomieDevice(self._prefix, device_id, self._router, parser, self._publisher, self._loop)
+            self._router.register(device)
+            self._device_discovered(device)
+            device._update(self._router.retained(device))
+            self._diagnostics.record(STAGE_DISCOVERY, time.perf_counter() - start)
+
+    # Liveness
+    def track_liveness(self, device: HomieDevice):
+        """(Re)start the deadline of a device from its $stats/interval."""
+        try:
+            interval = float(device.stats_interval)
+        except (TypeError, ValueError):
+            return
+        if interval > 0:
+            self._liveness.touch(device, interval * self._stats_timeout_multiplier)
+            if device._stale:
+                device._set_stale(False)
+
+    def _device_expired(self, device: HomieDevice):
+        _LOGGER.info(f"Homie Device {device.device_id} missed its $stats/uptime, marking it unavailable")
+        device._set_stale(True)
+
+    # Discovery Cache
+    def cache_snapshot(self) -> Dict:
+        """Return the snapshot of the devices worth caching and mark the cache clean."""
+        self._cache_dirty = False
+        devices = [device for device_id, device in self._devices.items()
+                   if device_id in self._live_devices or (not self._reconciled and device_id in self._restored_devices)]
+        return snapshot_devices(self._prefix, devices, self._retained)
+
+    def restore_cache(self, data: Optional[Dict]):
+        """Restore the topology and last values of a snapshot before the broker replays its retained topics."""
+        restored = restore_messages(self._prefix, data)
+        if restored:
+            self.process_messages([MQTTMessage(topic, payload, 0) for topic, payload in restored], False)
+            self._restored_devices.update(self._devices)
+
+    def _confirm_device(self, device_id: str):
+        # The broker knows the device, a restored device marked unavailable at reconcile is back
+        self._live_devices.add(device_id)
+        device = self._devices.get(device_id)
+        if device is not None and device._stale and self._reconciled:
+            device._set_stale(False)
+
+    def _reconcile_cache(self):
+        self._reconciled = True
+        self._cache_dirty = True
+        stale = self._restored_devices - self._live_devices
+        if stale:
+            _LOGGER.info(f"Homie Devices under {self._prefix}/ not confirmed by the broker, marked unavailable and dropped from the discovery cache: {sorted(stale)}")
+            for device_id in stale:
+                device = self._devices.get(device_id)
+                if device is not None:
+                    device._set_stale(True)
+
+    @property
+    def prefix(self):
+        """Return the base topic of the site."""
+        return self._prefix
+
+    @property
+    def devices(self) -> Devices:
+        """Return the devices discovered under the base topic."""
+        return self._devices
+
+    @property
+    def cache_dirty(self):
+        """Return True if the devices changed since the last cache snapshot."""
+        return self._cache_dirty
+
+    @property
+    def diagnostics(self):
+        """Return the diagnostics of the site."""
+        return self._diagnostics
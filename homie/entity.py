@@ -0,0 +1,127 @@
+# IMPORTS
+import asyncio
+import logging
+
+from homeassistant.helpers.entity import (Entity)
+from . import (KEY_HOMIE_ALREADY_DISCOVERED, KEY_HOMIE_ENTITY_IDS, KEY_HOMIE_PLATFORM, KEY_HOMIE_DEVICE_ENTITIES,
+               KEY_HOMIE_ENTITIES)
+from .homie_classes import (HomieObject, HomieDevice, HomieProperty)
+
+# TYPES
+from typing import (Callable)
+from homeassistant.helpers.typing import (HomeAssistantType)
+
+# CONSTANTS
+STATE_ATTRIBUTES = ('value', 'confirmed', 'name', 'unit')
+DEVICE_STATE_ATTRIBUTES = ('available',)
+
+# GLOBALS
+_LOGGER = logging.getLogger(__name__)
+
+
+def setup_homie_entities(hass: HomeAssistantType, discovery_info: dict, async_add_entities,
+                         entity_factory: Callable[[str, HomieProperty], 'HomieEntity']):
+    """Create the entities of every Property handed to a platform and add them in one call."""
+    entities = list()
+    for entity_id in discovery_info[KEY_HOMIE_ENTITY_IDS]:
+        homie_property = hass.data[KEY_HOMIE_ALREADY_DISCOVERED].get(entity_id)
+        if homie_property is None:
+            _LOGGER.warning(f"Homie Entity faild to recive a Homie Property to bind too: {entity_id}")
+            continue
+        entity = entity_factory(entity_id, homie_property)
+        # Set up front, Home Assistant would otherwise derive it from the $name of the Property
+        entity.entity_id = f"{discovery_info[KEY_HOMIE_PLATFORM]}.{entity_id}"
+        entities.append(entity)
+        homie_property.setup_requested = False
+        homie_property.is_setup = True
+
+    if entities:
+        async_add_entities(entities)
+
+
+class DeviceEntities:
+    # The entities of one Homie Device, their states are written in a single job when its availability flips
+
+    def __init__(self, hass: HomeAssistantType, device: HomieDevice):
+        self._hass = hass
+        self._entities = list()
+        self._remove_listener = device.add_listener(self._on_device_change)
+
+    def add(self, entity: 'HomieEntity'):
+        self._entities.append(entity)
+
+    def remove(self, entity: 'HomieEntity') -> bool:
+        """Remove an entity, returns True once the device has none left."""
+        if entity in self._entities:
+            self._entities.remove(entity)
+        if self._entities:
+            return False
+        self._remove_listener()
+        return True
+
+    def _on_device_change(self, source: HomieObject, attribute: str, old_value, new_value):
+        if attribute in DEVICE_STATE_ATTRIBUTES and self._entities:
+            self._hass.async_add_job(self._async_write_states(list(self._entities)))
+
+    @asyncio.coroutine
+    def _async_write_states(self, entities):
+        for entity in entities:
+            yield from entity.async_update_ha_state()
+
+
+class HomieEntity(Entity):
+    """An entity bound directly to a single Homie Property."""
+
+    def __init__(self, entity_id: str, homie_property: HomieProperty):
+        """Initialize the Homie Entity."""
+        self.entity_id_1 = entity_id
+        self._property = homie_property
+        self._remove_listeners = list()
+
+    @asyncio.coroutine
+    def async_added_to_hass(self):
+        """Subscribe to changes of the Homie Property and the availability of its Device."""
+        self._remove_listeners.append(self._property.add_listener(self._on_property_change))
+        self.hass.data[KEY_HOMIE_ENTITIES][self.entity_id_1] = self
+        device = self._property.node.device
+        device_entities = self.hass.data[KEY_HOMIE_DEVICE_ENTITIES]
+        if device not in device_entities:
+            device_entities[device] = DeviceEntities(self.hass, device)
+        device_entities[device].add(self)
+
+    @asyncio.coroutine
+    def async_will_remove_from_hass(self):
+        """Unsubscribe from changes of the Homie Property and its Device."""
+        for remove_listener in self._remove_listeners:
+            remove_listener()
+        self._remove_listeners.clear()
+        if self.hass.data[KEY_HOMIE_ENTITIES].get(self.entity_id_1) is self:
+            del self.hass.data[KEY_HOMIE_ENTITIES][self.entity_id_1]
+        device = self._property.node.device
+        device_entities = self.hass.data[KEY_HOMIE_DEVICE_ENTITIES]
+        if device in device_entities and device_entities[device].remove(self):
+            del device_entities[device]
+
+    def _on_property_change(self, source: HomieObject, attribute: str, old_value, new_value):
+        if attribute in STATE_ATTRIBUTES:
+            self.async_schedule_update_ha_state()
+
+    @property
+    def available(self):
+        """Return True if the Device of the Homie Property is available."""
+        return self._property.node.device.available
+
+    @property
+    def name(self):
+        """Return the friendly name of the Homie Property, its $name or else its entity id."""
+        return self._property.name or self.entity_id_1
+
+    @property
+    def assumed_state(self):
+        """Return true while the last change has not been confirmed by the device."""
+        return not self._property.confirmed
+
+    @property
+    def should_poll(self):
+        """No polling needed, state is pushed when the Homie Property changes."""
+        return False
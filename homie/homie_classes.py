@@ -1,80 +1,194 @@
 # IMPORTS
+import asyncio
 import logging
-import re
-from .mqtt_message import (MQTTMessage, DEFAULT_MQTT_MESSAGE)
+import sys
+import time
+from .payload_decoder import (compile_decoder, encode_value, parse_range)
+from .homie_parser import (HomieParser, HOMIE_2, NODES_TOPIC, PROPERTIES_TOPIC, SETTABLE_TOPIC, DECODER_ATTRIBUTES)
+from .topic_router import (TopicRouter, RetainedMessages)
+from .topic_tokenizer import (TopicTokens)
+from .value_filter import (ValueFilter)
 
 # TYPES
-from ._typing import (MessageQue)
+from typing import (Callable, Optional, Tuple)
 
-# REGEX
-DISCOVER_NODES = re.compile(r'(?P<prefix_topic>\w[-/\w]*\w)/(?P<device_id>\w[-\w]*\w)/\$properties')
+Listener = Callable[['HomieObject', str, object, object], None]
+Publisher = Callable[[Tuple[str, str], str, str], None]
 
 # GLOBALS
 _LOGGER = logging.getLogger(__name__)
 
 
-# TODO: Fix this as we dont want to set to empty when no topic in dic
-def _get_mqtt_message(topics: MessageQue, topic:str):
-    return topics.get(topic, DEFAULT_MQTT_MESSAGE)
-
-
-class HomieDevice:
+# Discovery States of a Homie Device, a device only ever moves forward through them
+STATE_ANNOUNCED = 'announced'
+STATE_ATTRIBUTES = 'attributes'
+STATE_NODES = 'nodes'
+STATE_PROPERTIES = 'properties'
+STATE_READY = 'ready'
+SET_TOPIC = 'set'
+# Device attributes that decide whether the device is available
+AVAILABILITY_ATTRIBUTES = ('online', 'state')
+
+
+class HomieObject:
+    # The shared change notification behaviour of Homie Devices, Nodes and Properties
+    __slots__ = ('_listeners',)
+
+    def __init__(self):
+        # Most objects never get a listener, so the list is only created on demand
+        self._listeners = None
+
+    def add_listener(self, listener: Listener):
+        """Call listener(source, attribute, old_value, new_value) on every change, returns a remove function."""
+        if self._listeners is None:
+            self._listeners = list()
+        self._listeners.append(listener)
+
+        def remove_listener():
+            if self._listeners and listener in self._listeners:
+                self._listeners.remove(listener)
+        return remove_listener
+
+    def _update(self, messages: RetainedMessages):
+        # Apply a batch of messages, used to replay the retained messages of a new owner
+        for tokens, payload in messages:
+            self._apply(tokens, payload)
+
+    def _apply(self, tokens: TopicTokens, payload: str):
+        raise NotImplementedError()
+
+    def _set_attribute(self, attribute: str, name: str, value):
+        # Only notify listeners when the value actually changed
+        old_value = getattr(self, attribute)
+        if old_value == value:
+            return
+        setattr(self, attribute, value)
+        self._notify(name, old_value, value)
+
+    def _notify(self, name: str, old_value, new_value):
+        if not self._listeners:
+            return
+        for listener in list(self._listeners):
+            listener(self, name, old_value, new_value)
+
+
+class HomieDevice(HomieObject):
     # A definition of a Homie Device
+    __slots__ = ('_router', '_nodes', '_base_topic', '_device_id', '_convention_version', '_online', '_name',
+                 '_ip', '_mac', '_uptime', '_signal', '_stats_interval', '_fw_name', '_fw_version', '_fw_checksum',
+                 '_implementation', '_state', '_extensions', '_node_ids', '_discovery_state', '_parser', '_publisher',
+                 '_stale', '_available', '_loop')
+
+    def __init__(self, base_topic: str, device_id: str, router: TopicRouter, parser: HomieParser = HOMIE_2,
+                 publisher: Optional[Publisher] = None, loop: Optional[asyncio.AbstractEventLoop] = None):
+        super().__init__()
+        _LOGGER.info(f"Homie Device Discovered. ID: {device_id}, Homie {parser.version}")
+        self._router = router
+        self._loop = loop
+        self._parser = parser
+        self._publisher = publisher
+        self._nodes = dict()
+        self._base_topic = sys.intern(base_topic)
+        self._device_id = sys.intern(device_id)
+
+        self._convention_version = None
+        self._online = None
+        self._name = None
+        self._ip = None
+        self._mac = None
+        self._uptime = None
+        self._signal = None
+        self._stats_interval = None
+        self._fw_name = None
+        self._fw_version = None
+        self._fw_checksum = None
+        self._implementation = None
+        self._state = None
+        self._extensions = None
+        self._node_ids = None
+        self._discovery_state = STATE_ANNOUNCED
+        self._stale = False
+        self._available = True
+
+    def _apply(self, tokens: TopicTokens, payload: str):
+        # Apply a single message to the one attribute it maps to
+        if tokens.node_id is None:
+            attribute = self._parser.device_attributes.get(tokens.attribute)
+            if attribute is not None:
+                self._set_attribute(*attribute, payload)
+                if attribute[1] in AVAILABILITY_ATTRIBUTES:
+                    self._update_availability()
+            elif tokens.attribute == NODES_TOPIC:
+                self._set_attribute('_node_ids', 'node_ids', self._parser.parse_nodes(payload))
+        elif tokens.property_id is None and tokens.attribute == PROPERTIES_TOPIC:
+            # Load Nodes that are available for this Device, only from a <node>/$properties topic
+            self._discover_node(tokens.node_id)
+        self._advance_discovery()
+
+    def _advance_discovery(self):
+        # Step through the Discovery States as far as the known topics allow
+        while self._discovery_state != STATE_READY:
+            next_state = self._next_discovery_state()
+            if next_state is None:
+                return
+            self._set_attribute('_discovery_state', 'discovery_state', next_state)
+            if next_state == STATE_READY:
+                _LOGGER.info(f"Homie Device Ready. ID: {self._device_id}")
+
+    def _next_discovery_state(self):
+        state = self._discovery_state
+        if state == STATE_ANNOUNCED:
+            if all(getattr(self, attribute) is not None for attribute in self._parser.required_attributes):
+                return STATE_ATTRIBUTES
+        elif state == STATE_ATTRIBUTES:
+            # Without a $nodes list the nodes are known once the first one is discovered
+            if self._node_ids is None:
+                if self._nodes:
+                    return STATE_NODES
+            elif all(node_id in self._nodes for node_id in self._node_ids):
+                return STATE_NODES
+        elif state == STATE_NODES:
+            required = self._parser.required_property_attributes
+            if all(node._type is not None and node._properties and
+                   all(getattr(property, attribute) is not None for property in node._properties.values() for attribute in required)
+                   for node in self._nodes.values()):
+                return STATE_PROPERTIES
+        elif state == STATE_PROPERTIES:
+            return STATE_READY
+        return None
 
-    def __init__(self, base_topic: str, device_id: str):
-        _LOGGER.info(f"Homie Device Discovered. ID: {device_id}")
-        self._nodes = list()
-        self._base_topic = base_topic
-        self._device_id = device_id
-        self._prefix_topic = f'{base_topic}/{device_id}'
-
-    def _update(self, topics: MessageQue):
-        # Load Device Properties
-        self._convention_version = _get_mqtt_message(topics, f'{self._prefix_topic}/$homie').payload
-        self._online = _get_mqtt_message(topics, f'{self._prefix_topic}/$online').payload
-        self._name = _get_mqtt_message(topics, f'{self._prefix_topic}/$name').payload
-        self._ip = _get_mqtt_message(topics, f'{self._prefix_topic}/$localip').payload
-        self._mac = _get_mqtt_message(topics, f'{self._prefix_topic}/$mac').payload
-
-        # Load Device Stats Properties
-        self._uptime = _get_mqtt_message(topics, f'{self._prefix_topic}/$stats/uptime').payload
-        self._signal = _get_mqtt_message(topics, f'{self._prefix_topic}/$stats/signal').payload
-        self._stats_interval = _get_mqtt_message(topics, f'{self._prefix_topic}/$stats/interval').payload
-
-        # Load Firmware Properties
-        self._fw_name = _get_mqtt_message(topics, f'{self._prefix_topic}/$fw/name').payload
-        self._fw_version = _get_mqtt_message(topics, f'{self._prefix_topic}/$fw/version').payload
-        self._fw_checksum = _get_mqtt_message(topics, f'{self._prefix_topic}/$fw/checksum').payload
-
-        # Load Implementation Properties
-        self._implementation = _get_mqtt_message(topics, f'{self._prefix_topic}/$implementation').payload
-
-        # Load Nodes that are available for this Device
-        self._discover_nodes(topics)
-        for node in self._nodes:
-            filtered_topics = {k:v for (k,v) in topics.items() if node._base_topic in k}
-            node._update(filtered_topics)
-
-    def _discover_nodes(self, topics: MessageQue):
-        for topic, message in topics.items():
-            node_match = DISCOVER_NODES.match(topic)
-            if node_match:
-                node_base_topic = node_match.group('prefix_topic')
-                node_id = node_match.group('device_id')
-                if not self._has_node(node_id):
-                    node = HomieNode(self, node_base_topic, node_id)
-                    self._nodes.append(node)
+    def _discover_node(self, node_id: str):
+        if not self._has_node(node_id):
+            node = HomieNode(self, node_id)
+            self._nodes[node_id] = node
+            self._notify('node', None, node)
+            node._update(self._router.retained(node))
 
     def _has_node(self, node_id: str):
-        if self._get_node(node_id) is None:
-            return False
-        return True
+        return node_id in self._nodes
+
+    def _set_stale(self, stale: bool):
+        # Set by the liveness tracking when $stats/uptime stops arriving, or when the broker does not confirm a restored device
+        self._stale = stale
+        self._update_availability()
+
+    def _update_availability(self):
+        self._set_attribute('_available', 'available', self.online is not False and not self._stale)
+
+    def _publish(self, topic: str, payload: str):
+        if self._publisher is None:
+            _LOGGER.warning(f"Homie Device {self._device_id} can not publish to {topic}")
+            return
+        # Rate limited per (base topic, device id), each discovery prefix is its own site
+        self._publisher((self._base_topic, self._device_id), topic, payload)
 
     def _get_node(self, node_id: str):
-        for node in self._nodes:
-            if node.node_id == node_id:
-                return node
-        return None
+        return self._nodes.get(node_id)
+
+    @property
+    def _prefix_topic(self):
+        # Built on demand rather than kept as a copy on every object
+        return f'{self._base_topic}/{self._device_id}'
 
     @property
     def base_topic(self):
@@ -98,8 +212,28 @@ class HomieDevice:
 
     @property
     def online(self):
-        """Return true if the device is online."""
-        return self._online
+        """Return true if the device is online, from $online or $state depending on its Homie version."""
+        return self._parser.is_online(self._online, self._state)
+
+    @property
+    def state(self):
+        """Return the $state of the device, Homie 3.0 and later."""
+        return self._state
+
+    @property
+    def available(self):
+        """Return False when the device is offline or stopped sending $stats/uptime."""
+        return self._available
+
+    @property
+    def extensions(self):
+        """Return the $extensions of the device, Homie 4.0 and later."""
+        return self._extensions
+
+    @property
+    def parser(self):
+        """Return the parser of the Homie version the device announced."""
+        return self._parser
 
     @property
     def ip(self):
@@ -141,64 +275,89 @@ class HomieDevice:
         """Return the Firmware Checksum of the device."""
         return self._fw_checksum
 
+    @property
+    def discovery_state(self):
+        """Return the Discovery State of the device."""
+        return self._discovery_state
+
+    @property
+    def ready(self):
+        """Return True once the device has been fully discovered."""
+        return self._discovery_state == STATE_READY
+
     @property
     def nodes(self):
-        """Return a List of Nodes for the device."""
-        return self._nodes
+        """Return the Nodes for the device in discovery order."""
+        return self._nodes.values()
 
-    def node(self, node_id):
+    def has_node(self, node_id: str):
+        """Return True if the device has the Node."""
+        return self._has_node(node_id)
+
+    def node(self, node_id: str):
         """Return a specific Node for the device."""
-        return self._get_node(node_name)
+        return self._get_node(node_id)
     
     def __str__(self):
         return f"{self.device_id} - {self.name} - {len(self.nodes)}"
 
 
-class HomieNode:
+class HomieNode(HomieObject):
     # A definition of a Homie Node
-    def __init__(self, device: HomieDevice, base_topic: str, node_id: str):
+    __slots__ = ('_device', '_properties', '_node_id', '_type', '_name')
+
+    def __init__(self, device: HomieDevice, node_id: str):
+        super().__init__()
         _LOGGER.info(f"Homie Node Discovered. ID: {node_id}")
         self._device = device
-        self._properties = list()
-        self._base_topic = base_topic
-        self._node_id = node_id
-        self._prefix_topic = f'{base_topic}/{node_id}'
-        self._is_setup = False
-
-    def _update(self, topics: MessageQue):
-        # Load Node Properties
-        self._type = _get_mqtt_message(topics, f'{self._prefix_topic}/$type').payload
-
-        # load Properties that are avaliable to this Node
-        self._discover_property(topics)
-        for property in self._properties:
-            filtered_topics = {k:v for (k,v) in topics.items() if property._base_topic in k}
-            property._update(filtered_topics)
-
-    def _discover_property(self, topics: MessageQue):
-        properties_message = _get_mqtt_message(topics, f'{self._prefix_topic}/$properties').payload
+        self._properties = dict()
+        self._node_id = sys.intern(node_id)
+
+        self._type = None
+        self._name = None
+
+    def _apply(self, tokens: TopicTokens, payload: str):
+        # Apply a single message to the one attribute it maps to, messages of undiscovered properties are skipped
+        if tokens.property_id is not None:
+            return
+        attribute = self._device._parser.node_attributes.get(tokens.attribute)
+        if attribute is not None:
+            self._set_attribute(*attribute, payload)
+        elif tokens.attribute == PROPERTIES_TOPIC:
+            # load Properties that are avaliable to this Node
+            self._discover_property(payload)
+        else:
+            return
+        self._device._advance_discovery()
+
+    def _discover_property(self, properties_message: str):
         if properties_message:
-            properties = properties_message.split(',')
-            for property_id in properties:
+            for property_id, settable in self._device._parser.parse_properties(properties_message):
                 if not self._has_property(property_id):
-                    property = HomieProperty(self, self._prefix_topic, property_id, False)
-                    self._properties.append(property)
+                    property = HomieProperty(self, property_id, settable)
+                    self._properties[property_id] = property
+                    self._notify('property', None, property)
+                    property._update(self._device._router.retained(property))
 
     def _has_property(self, property_id: str):
-        if self._get_property(property_id) is None:
-            return False
-        return True
+        return property_id in self._properties
 
     def _get_property(self, property_id: str):
-        for property in self._properties:
-            if property.property_id == property_id:
-                return property
-        return None
+        return self._properties.get(property_id)
+
+    @property
+    def _prefix_topic(self):
+        return f'{self._device._prefix_topic}/{self._node_id}'
 
     @property
     def base_topic(self):
         """Return the Base Topic of the node."""
-        return self._base_topic
+        return self._device._prefix_topic
+
+    @property
+    def device(self):
+        """Return the Device of the node."""
+        return self._device
 
     @property
     def node_id(self):
@@ -209,22 +368,19 @@ class HomieNode:
     def type(self):
         """Return the Type of the node."""
         return self._type
-    
-    @property
-    def is_setup(self):
-        """Return True if the node has been setup as a component"""
-        return self._is_setup
-    @is_setup.setter
-    def is_setup(self, value: bool):
-        self._is_setup = value
 
+    @property
+    def name(self):
+        """Return the Name of the node, Homie 3.0 and later."""
+        return self._name
+    
     @property
     def properties(self):
-        """Return a List of properties for the node."""
-        return self._properties
+        """Return the properties for the node in discovery order."""
+        return self._properties.values()
 
     def has_property(self, property_name: str):
-        """Return a specific Property for the node."""
+        """Return True if the node has the Property."""
         return self._has_property(property_name)
 
     def property(self, property_name: str):
@@ -232,20 +388,134 @@ class HomieNode:
         return self._get_property(property_name)
 
 
-class HomieProperty:
+class HomieProperty(HomieObject):
     # A definition of a Homie Property
-    def __init__(self, node: HomieNode, base_topic: str, property_id: str, settable: bool):
+    __slots__ = ('_node', '_property_id', '_settable', '_payload', '_decoder', '_set_payload', '_confirmed', '_value',
+                 '_name', '_unit', '_datatype', '_format', '_is_setup', '_setup_requested', '_value_filter', '_last_write',
+                 '_pending_value', '_pending_timer')
+
+    def __init__(self, node: HomieNode, property_id: str, settable: bool):
+        super().__init__()
         _LOGGER.info(f"Homie Property Discovered. ID: {property_id}")
         self._node = node
-        self._base_topic = base_topic
-        self._property_id = property_id
+        self._property_id = sys.intern(property_id)
         self._settable = settable
-        self._prefix_topic = f'{base_topic}/{property_id}'
+        self._is_setup = False
+        self._setup_requested = False
 
+        self._payload = None
+        self._decoder = None
+        self._set_payload = None
+        self._confirmed = True
         self._value = None
+        self._value_filter = None
+        self._last_write = None
+        self._pending_value = None
+        self._pending_timer = None
+        self._name = None
+        self._unit = None
+        self._datatype = None
+        self._format = None
+
+    def _apply(self, tokens: TopicTokens, payload: str):
+        subtopic = tokens.attribute
+        if subtopic is None:
+            self._payload = payload
+            # An echo of a value that was set always confirms it, unfiltered
+            self._decode(filtered=self._set_payload is None)
+            if self._set_payload is not None:
+                # The device echoed a value, whatever it reports is the state from now on
+                self._set_payload = None
+                self._set_attribute('_confirmed', 'confirmed', True)
+            return
+        if subtopic == SETTABLE_TOPIC:
+            self._set_attribute('_settable', 'settable', payload == 'true')
+            return
+        attribute = self._node._device._parser.property_attributes.get(subtopic)
+        if attribute is not None:
+            self._set_attribute(*attribute, payload)
+            if subtopic in DECODER_ATTRIBUTES:
+                # Recompiled on the next value, the last payload is decoded again with the new type
+                self._decoder = None
+                if self._payload is not None:
+                    self._decode()
+            if attribute[0] in self._node._device._parser.required_property_attributes:
+                self._node._device._advance_discovery()
+
+    def _decode(self, payload: Optional[str] = None, filtered: bool = False):
+        # Decode the payload once, every consumer reads the decoded value
+        if self._decoder is None:
+            self._decoder = compile_decoder(self._datatype, self._format)
+        try:
+            value = self._decoder(self._payload if payload is None else payload)
+        except ValueError as error:
+            _LOGGER.warning(f"Ignoring value of {self._prefix_topic}: {error}")
+            return False
 
-    def _update(self, topics: MessageQue):
-        self._value = _get_mqtt_message(topics, self._prefix_topic).payload
+        value_filter = self._value_filter
+        if filtered and value_filter is not None:
+            # Within the minimum interval only the newest value is kept, it is written when the interval ends
+            if self._pending_timer is not None:
+                self._pending_value = value
+                return True
+            loop = self._node._device._loop
+            wait = value_filter.wait(self._last_write, time.monotonic())
+            if wait and loop is not None:
+                self._pending_value = value
+                self._pending_timer = loop.call_later(wait, self._write_pending)
+                return True
+            self._write_filtered(value)
+            return True
+        # Newer than any value still waiting for the end of its interval
+        self._cancel_pending()
+        self._set_attribute('_value', 'value', value)
+        return True
+
+    def _write_filtered(self, value):
+        # Deadband is measured against the last value that was written
+        if not self._value_filter.accept(self._value, value):
+            return
+        self._last_write = time.monotonic()
+        if value == self._value:
+            self._notify('value', self._value, value)
+        else:
+            self._set_attribute('_value', 'value', value)
+
+    def _write_pending(self):
+        value = self._pending_value
+        self._pending_timer = None
+        self._pending_value = None
+        if self._value_filter is None:
+            self._set_attribute('_value', 'value', value)
+        else:
+            self._write_filtered(value)
+
+    def _cancel_pending(self):
+        if self._pending_timer is not None:
+            self._pending_timer.cancel()
+            self._pending_timer = None
+            self._pending_value = None
+
+    def set_value(self, value):
+        """Publish a new value to the Property, shown optimistically until the device echoes its state."""
+        if not self._settable:
+            _LOGGER.warning(f"Homie Property {self._prefix_topic} is not settable")
+            return
+        payload = encode_value(value)
+        if not self._decode(payload):
+            return
+        self._set_payload = payload
+        self._set_attribute('_confirmed', 'confirmed', False)
+        self._node._device._publish(f'{self._prefix_topic}/{SET_TOPIC}', payload)
+
+    @property
+    def _prefix_topic(self):
+        return f'{self._node._prefix_topic}/{self._property_id}'
+
+    @property
+    def node(self):
+        """Return the Node of the Property."""
+        return self._node
 
     @property
     def property_id(self):
@@ -262,6 +532,11 @@ class HomieProperty:
         """Return the Settablity of the Property."""
         return self._settable
 
+    @property
+    def confirmed(self):
+        """Return False while a value that was set has not been echoed by the device."""
+        return self._confirmed
+
     @property
     def name(self):
         """Return the Name of the Property."""
@@ -277,7 +552,46 @@ class HomieProperty:
         """Return the Data Type for the Property."""
         return self._datatype
 
+    @property
+    def datatype(self):
+        """Return the Data Type for the Property."""
+        return self._datatype
+
+    @property
+    def payload(self):
+        """Return the last raw payload of the Property."""
+        return self._payload
+
     @property
     def format(self):
         """Return the Format for the Property."""
         return self._format
+
+    @property
+    def range(self):
+        """Return the (low, high) bounds of a numeric Property, None when it is unbounded."""
+        return parse_range(self._format)
+
+    @property
+    def value_filter(self):
+        """Return the filter deciding which values of the Property are written."""
+        return self._value_filter
+    @value_filter.setter
+    def value_filter(self, value: Optional[ValueFilter]):
+        self._value_filter = value
+
+    @property
+    def is_setup(self):
+        """Return True if the property has been setup as an entity"""
+        return self._is_setup
+    @is_setup.setter
+    def is_setup(self, value: bool):
+        self._set_attribute('_is_setup', 'is_setup', value)
+
+    @property
+    def setup_requested(self):
+        """Return True while the property has been submitted to a platform that has not set it up yet"""
+        return self._setup_requested
+    @setup_requested.setter
+    def setup_requested(self, value: bool):
+        self._setup_requested = value
@@ -0,0 +1,125 @@
+# IMPORTS
+import logging
+
+# TYPES
+from typing import (Dict, List, Optional, Tuple)
+
+AttributeMap = Dict[str, Tuple[str, str]]
+
+# CONSTANTS
+NODES_TOPIC = '$nodes'
+PROPERTIES_TOPIC = '$properties'
+SETTABLE_TOPIC = '$settable'
+SETTABLE_FLAG = 'settable'
+HOMIE_STATE_READY = 'ready'
+
+# Maps a topic relative to its owner onto the (attribute, public name) it updates
+DEVICE_ATTRIBUTES_2 = {
+    '$homie': ('_convention_version', 'homie_version'),
+    '$online': ('_online', 'online'),
+    '$name': ('_name', 'name'),
+    '$localip': ('_ip', 'ip'),
+    '$mac': ('_mac', 'mac'),
+    '$stats/uptime': ('_uptime', 'uptime'),
+    '$stats/signal': ('_signal', 'signal'),
+    '$stats/interval': ('_stats_interval', 'stats_interval'),
+    '$fw/name': ('_fw_name', 'firmware_name'),
+    '$fw/version': ('_fw_version', 'firmware_version'),
+    '$fw/checksum': ('_fw_checksum', 'firmware_checksum'),
+    '$implementation': ('_implementation', 'implementation'),
+}
+# 3.0 replaces $online by $state, 4.0 keeps $stats and $fw only as the legacy extensions
+DEVICE_ATTRIBUTES_3 = {
+    **{subtopic: attribute for subtopic, attribute in DEVICE_ATTRIBUTES_2.items() if subtopic != '$online'},
+    '$state': ('_state', 'state'),
+}
+DEVICE_ATTRIBUTES_4 = {
+    **DEVICE_ATTRIBUTES_3,
+    '$extensions': ('_extensions', 'extensions'),
+}
+NODE_ATTRIBUTES_2 = {
+    '$type': ('_type', 'type'),
+}
+NODE_ATTRIBUTES_3 = {
+    **NODE_ATTRIBUTES_2,
+    '$name': ('_name', 'name'),
+}
+PROPERTY_ATTRIBUTES = {
+    '$name': ('_name', 'name'),
+    '$unit': ('_unit', 'unit'),
+    '$datatype': ('_datatype', 'datatype'),
+    '$format': ('_format', 'format'),
+}
+# Property attributes that change how its payload is decoded
+DECODER_ATTRIBUTES = ('$datatype', '$format')
+
+# GLOBALS
+_LOGGER = logging.getLogger(__name__)
+
+
+class HomieParser:
+    # The topic layout of one version of the Homie convention, shared by every device announcing it
+    __slots__ = ('version', 'device_attributes', 'node_attributes', 'property_attributes', 'required_attributes',
+                 'required_property_attributes')
+
+    def __init__(self, version: str, device_attributes: AttributeMap, node_attributes: AttributeMap,
+                 property_attributes: AttributeMap, required_attributes: Tuple[str, ...],
+                 required_property_attributes: Tuple[str, ...] = ()):
+        self.version = version
+        self.device_attributes = device_attributes
+        self.node_attributes = node_attributes
+        self.property_attributes = property_attributes
+        self.required_attributes = required_attributes
+        self.required_property_attributes = required_property_attributes
+
+    def parse_nodes(self, payload: str) -> Tuple[str, ...]:
+        """Return the node ids of a $nodes payload."""
+        # Entries are 'id', 'id:type' or 'id[]' depending on the firmware
+        return tuple(entry.split(':')[0].rstrip('[]') for entry in payload.split(',') if entry)
+
+    def parse_properties(self, payload: str) -> List[Tuple[str, bool]]:
+        """Return the (property id, settable) pairs of a $properties payload."""
+        properties = list()
+        for entry in payload.split(','):
+            # Homie 2.0 flags settable properties as 'id:settable'
+            property_id, _, flags = entry.partition(':')
+            if property_id:
+                properties.append((property_id, flags == SETTABLE_FLAG))
+        return properties
+
+    def is_online(self, online: Optional[str], state: Optional[str]) -> Optional[bool]:
+        """Return whether a device is online according to its $online or $state."""
+        if online is None:
+            return None
+        return online == 'true'
+
+
+class HomieStateParser(HomieParser):
+    # Homie 3.0 and later report a $state instead of $online and flag settable properties through $settable
+    __slots__ = ()
+
+    def parse_properties(self, payload: str) -> List[Tuple[str, bool]]:
+        """Return the (property id, settable) pairs of a $properties payload."""
+        return [(entry.rstrip('[]'), False) for entry in payload.split(',') if entry]
+
+    def is_online(self, online: Optional[str], state: Optional[str]) -> Optional[bool]:
+        """Return whether a device is online according to its $online or $state."""
+        if state is None:
+            return None
+        return state == HOMIE_STATE_READY
+
+
+HOMIE_2 = HomieParser('2', DEVICE_ATTRIBUTES_2, NODE_ATTRIBUTES_2, PROPERTY_ATTRIBUTES,
+                      ('_convention_version', '_name', '_online'))
+# $datatype decides the platform of a property, so 3.0 and later devices wait for it before they are ready
+HOMIE_3 = HomieStateParser('3', DEVICE_ATTRIBUTES_3, NODE_ATTRIBUTES_3, PROPERTY_ATTRIBUTES,
+                           ('_convention_version', '_name', '_state'), ('_datatype',))
+HOMIE_4 = HomieStateParser('4', DEVICE_ATTRIBUTES_4, NODE_ATTRIBUTES_3, PROPERTY_ATTRIBUTES,
+                           ('_convention_version', '_name', '_state'), ('_datatype',))
+PARSERS = {parser.version: parser for parser in (HOMIE_2, HOMIE_3, HOMIE_4)}
+SUPPORTED_VERSIONS = list(PARSERS)
+
+
+def parser_for(convention_version: str) -> Optional[HomieParser]:
+    """Return the parser of the major version announced in $homie, None when it is not supported."""
+    return PARSERS.get(convention_version.partition('.')[0])
@@ -0,0 +1,127 @@
+# IMPORTS
+import asyncio
+import logging
+import threading
+import time
+from collections import (OrderedDict)
+from .mqtt_message import (MQTTMessage)
+from .topic_tokenizer import (TopicTokenizer, TopicTokens, TOPIC_SET)
+
+# TYPES
+from typing import (Callable, Dict, List, Tuple)
+
+Batch = List[Tuple[MQTTMessage, TopicTokens]]
+
+# CONSTANTS
+DEFAULT_QUEUE_SIZE = 10000
+STOP_TIMEOUT = 1.0
+
+# GLOBALS
+_LOGGER = logging.getLogger(__name__)
+
+
+class IngestionWorker:
+    # Tokenizes raw messages on a worker thread and hands the tokenized batches back to the event loop, nothing else is offloaded
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, tokenizer: TopicTokenizer,
+                 apply_batch: Callable[[Batch, float], None], max_size: int = DEFAULT_QUEUE_SIZE):
+        if max_size < 1:
+            raise ValueError(f"The ingestion queue must hold at least one message, not {max_size}")
+        self._loop = loop
+        self._tokenizer = tokenizer
+        self._apply_batch = apply_batch
+        self._max_size = max_size
+        self._condition = threading.Condition()
+        # Values and attributes are kept apart so an overflow drops values before the topology
+        self._values = OrderedDict()
+        self._attributes = OrderedDict()
+        self._applied = threading.Event()
+        self._applied.set()
+        self._thread = None
+        self._running = False
+        self._coalesced = 0
+        self._overflowed = 0
+        self._batches = 0
+
+    def start(self):
+        """Start the worker thread."""
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='HomieIngestionWorker', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the worker thread and drop the waiting messages."""
+        with self._condition:
+            self._running = False
+            self._values.clear()
+            self._attributes.clear()
+            self._condition.notify()
+        self._applied.set()
+        if self._thread is not None:
+            self._thread.join(STOP_TIMEOUT)
+            self._thread = None
+
+    def put(self, topic: str, payload: str, qos: int):
+        """Queue a raw message, replacing an older payload of the same topic that is still waiting."""
+        is_attribute = '/$' in topic
+        with self._condition:
+            # Looked up under the lock, the worker swaps the dicts when it takes a batch
+            pending = self._attributes if is_attribute else self._values
+            if pending.pop(topic, None) is not None:
+                self._coalesced += 1
+            elif len(self._values) + len(self._attributes) >= self._max_size:
+                (self._values or self._attributes).popitem(last=False)
+                self._overflowed += 1
+            pending[topic] = (payload, qos)
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            # One batch at a time, messages arriving meanwhile are coalesced in the queue
+            self._applied.wait()
+            with self._condition:
+                while self._running and not (self._values or self._attributes):
+                    self._condition.wait()
+                if not self._running:
+                    return
+                attributes, values = self._attributes, self._values
+                self._attributes, self._values = OrderedDict(), OrderedDict()
+
+            start = time.perf_counter()
+            try:
+                batch = self._resolve(attributes, values)
+            except Exception:
+                # A single bad message must not stop the ingestion
+                _LOGGER.exception("Homie Ingestion Worker failed to resolve a batch")
+                continue
+            if batch:
+                self._batches += 1
+                self._applied.clear()
+                self._loop.call_soon_threadsafe(self._apply, batch, time.perf_counter() - start)
+
+    def _resolve(self, attributes: OrderedDict, values: OrderedDict) -> Batch:
+        # Attributes first, so the topology is known before the values that depend on it
+        batch = list()
+        for pending in (attributes, values):
+            for topic, (payload, qos) in pending.items():
+                tokens = self._tokenizer.tokenize(topic)
+                if tokens is not None and tokens.kind != TOPIC_SET:
+                    batch.append((MQTTMessage(topic, payload, qos), tokens))
+        return batch
+
+    def _apply(self, batch: Batch, seconds: float):
+        # Runs on the event loop
+        try:
+            self._apply_batch(batch, seconds)
+        finally:
+            self._applied.set()
+
+    @property
+    def pending(self):
+        """Return the number of messages waiting for the worker."""
+        return len(self._values) + len(self._attributes)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Return the number of coalesced and overflowed messages and of batches handed to the loop."""
+        return {'coalesced': self._coalesced, 'overflowed': self._overflowed, 'batches': self._batches}
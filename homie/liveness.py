@@ -0,0 +1,85 @@
+# IMPORTS
+import asyncio
+import logging
+import math
+import time
+
+# TYPES
+from typing import (Any, Callable)
+
+# CONSTANTS
+DEFAULT_RESOLUTION = 1.0
+DEFAULT_TIMEOUT_MULTIPLIER = 3
+
+# GLOBALS
+_LOGGER = logging.getLogger(__name__)
+
+
+class LivenessWheel:
+    # A single timer wheel for the whole fleet, deadlines are bucketed per resolution step on the monotonic clock
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, on_expired: Callable[[Any], None],
+                 resolution: float = DEFAULT_RESOLUTION):
+        self._loop = loop
+        self._on_expired = on_expired
+        self._resolution = resolution
+        self._deadlines = dict()
+        self._buckets = dict()
+        self._timer = None
+        self._next_slot = None
+
+    def touch(self, owner: Any, timeout: float):
+        """(Re)start the deadline of an owner, on_expired(owner) is called when it passes without a new touch."""
+        self._discard(owner)
+        deadline = time.monotonic() + timeout
+        slot = math.ceil(deadline / self._resolution)
+        self._deadlines[owner] = slot
+        self._buckets.setdefault(slot, set()).add(owner)
+        self._schedule(slot)
+
+    def remove(self, owner: Any):
+        """Stop tracking an owner."""
+        self._discard(owner)
+
+    def cancel(self):
+        """Stop the wheel and forget every deadline."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+            self._next_slot = None
+        self._deadlines.clear()
+        self._buckets.clear()
+
+    def _discard(self, owner: Any):
+        slot = self._deadlines.pop(owner, None)
+        if slot is not None:
+            bucket = self._buckets[slot]
+            bucket.discard(owner)
+            if not bucket:
+                del self._buckets[slot]
+
+    def _schedule(self, slot: int):
+        # One timer, only while deadlines are pending, at the earliest slot
+        if self._next_slot is not None and self._next_slot <= slot:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._next_slot = slot
+        self._timer = self._loop.call_later(max(0, slot * self._resolution - time.monotonic()), self._tick)
+
+    def _tick(self):
+        self._timer = None
+        self._next_slot = None
+        now_slot = math.floor(time.monotonic() / self._resolution)
+        expired = list()
+        for slot in [slot for slot in self._buckets if slot <= now_slot]:
+            for owner in self._buckets.pop(slot):
+                del self._deadlines[owner]
+                expired.append(owner)
+        for owner in expired:
+            self._on_expired(owner)
+        if self._buckets:
+            self._schedule(min(self._buckets))
+
+    def __len__(self):
+        return len(self._deadlines)
@@ -0,0 +1,153 @@
+# IMPORTS
+import asyncio
+import logging
+from .homie_classes import (HomieObject, HomieDevice, HomieNode, HomieProperty, Listener, STATE_READY)
+from .discovery_prefix import (DiscoveryPrefix)
+from .value_filter import (ValueFilters, ValueFilter)
+from .outbound_queue import (OutboundQueue, DEFAULT_COALESCE_WINDOW, DEFAULT_RATE_LIMIT)
+from .diagnostics import (HomieDiagnostics)
+
+# TYPES
+from typing import (Callable, Dict, List, Optional)
+
+# CONSTANTS
+DEFAULT_DISCOVERY_PREFIX = 'homie'
+
+# GLOBALS
+_LOGGER = logging.getLogger(__name__)
+
+
+class HomieManager:
+    # The Homie engine without Home Assistant: fed raw MQTT messages, it keeps the devices of every discovery prefix
+    # up to date and reports their changes. Transport, storage and entities are left to the caller.
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, prefixes: List[str] = None,
+                 publish: Optional[Callable[[str, str], None]] = None,
+                 property_ready: Optional[Callable[[HomieProperty], None]] = None,
+                 value_filters: ValueFilters = None, set_coalesce_window: float = DEFAULT_COALESCE_WINDOW,
+                 set_rate_limit: float = DEFAULT_RATE_LIMIT, **site_options):
+        self._loop = loop
+        self._property_ready = property_ready
+        self._value_filters = value_filters or ValueFilters(ValueFilter())
+        self._listeners = list()
+
+        # Writes to settable properties are coalesced per topic and rate limited per device
+        self._outbound = OutboundQueue(loop, publish or self._drop_message, set_coalesce_window, set_rate_limit)
+
+        # Every base topic is its own site, with its own registry, router, queues and stats (site_options)
+        self._sites = dict()
+        for prefix in prefixes or [DEFAULT_DISCOVERY_PREFIX]:
+            self._sites[prefix] = DiscoveryPrefix(loop, prefix, self._outbound.put, self._device_discovered, **site_options)
+        self._site_prefixes = [(f'{prefix}/', site) for prefix, site in self._sites.items()]
+
+        # Engine gauges, each site reports its own below prefixes
+        self._diagnostics = HomieDiagnostics()
+        self._diagnostics.add_gauge('outbound_pending', lambda: self._outbound.pending)
+        self._diagnostics.add_gauge('outbound', lambda: self._outbound.stats)
+        self._diagnostics.add_gauge('prefixes', lambda: {prefix: site.diagnostics.snapshot() for prefix, site in self._sites.items()})
+
+    def start(self):
+        """Start the ingestion of every site."""
+        for site in self._sites.values():
+            site.start()
+
+    def stop(self):
+        """Stop every timer and worker and drop the pending writes."""
+        for site in self._sites.values():
+            site.cancel()
+        self._outbound.cancel()
+
+    def feed(self, topic: str, payload: str, qos: int = 0) -> bool:
+        """Accept a message from the broker, returns False if no discovery prefix owns its topic."""
+        for prefix, site in self._site_prefixes:
+            if topic.startswith(prefix):
+                site.receive(topic, payload, qos)
+                return True
+        return False
+
+    def flush(self):
+        """Apply the messages that are still waiting for their batch."""
+        for site in self._sites.values():
+            site.flush()
+
+    def devices(self, prefix: Optional[str] = None) -> List[HomieDevice]:
+        """Return the discovered devices, of one discovery prefix or of all of them."""
+        if prefix is not None:
+            return list(self._sites[prefix].devices.values())
+        return [device for site in self._sites.values() for device in site.devices.values()]
+
+    def add_listener(self, listener: Listener):
+        """Call listener(source, attribute, old_value, new_value) on every change of a Device, Node or Property, returns a remove function."""
+        self._listeners.append(listener)
+
+        def remove_listener():
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+        return remove_listener
+
+    def site_of(self, device: HomieDevice) -> DiscoveryPrefix:
+        """Return the site a device was discovered on."""
+        return self._sites[device.base_topic]
+
+    def _changed(self, source: HomieObject, attribute: str, old_value, new_value):
+        for listener in list(self._listeners):
+            listener(source, attribute, old_value, new_value)
+
+    def _drop_message(self, topic: str, payload: str):
+        _LOGGER.debug(f"No publisher, dropping {topic}: {payload}")
+
+    # Discovery
+    def _device_discovered(self, device: HomieDevice):
+        device.add_listener(self._device_changed)
+
+    def _device_changed(self, device: HomieDevice, attribute: str, old_value, new_value):
+        if attribute in ('uptime', 'stats_interval'):
+            self.site_of(device).track_liveness(device)
+        elif attribute == 'node':
+            new_value.add_listener(self._node_changed)
+        elif attribute == 'discovery_state' and new_value == STATE_READY:
+            # Properties are only ready once the device has been fully discovered
+            for node in device.nodes:
+                for property in node.properties:
+                    self._queue_property(property)
+        if self._listeners:
+            self._changed(device, attribute, old_value, new_value)
+
+    def _node_changed(self, node: HomieNode, attribute: str, old_value, new_value):
+        if attribute == 'property':
+            # Set before the retained values of the Property are replayed
+            new_value.value_filter = self._value_filters.for_property(node.device.device_id, node.node_id, new_value.property_id)
+            new_value.add_listener(self._property_changed)
+            if node.device.ready:
+                self._queue_property(new_value)
+        elif attribute == 'type' and node.device.ready:
+            for property in node.properties:
+                self._queue_property(property)
+        if self._listeners:
+            self._changed(node, attribute, old_value, new_value)
+
+    def _property_changed(self, property: HomieProperty, attribute: str, old_value, new_value):
+        # A Property is rechecked whenever it learns what it maps to, and once its entity is set up
+        if attribute in ('datatype', 'settable', 'is_setup') and property.node.device.ready:
+            self._queue_property(property)
+        if self._listeners:
+            self._changed(property, attribute, old_value, new_value)
+
+    def _queue_property(self, property: HomieProperty):
+        if self._property_ready is not None:
+            self._property_ready(property)
+
+    @property
+    def sites(self) -> Dict[str, DiscoveryPrefix]:
+        """Return the sites by discovery prefix."""
+        return self._sites
+
+    @property
+    def outbound(self):
+        """Return the queue of writes to settable properties."""
+        return self._outbound
+
+    @property
+    def diagnostics(self):
+        """Return the diagnostics of the engine, every site included."""
+        return self._diagnostics
@@ -0,0 +1,63 @@
+# IMPORTS
+import asyncio
+import logging
+from collections import (OrderedDict)
+from .mqtt_message import (MQTTMessage)
+
+# TYPES
+from typing import (Callable, List)
+
+# CONSTANTS
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_BATCH_DELAY = 0.05
+
+# GLOBALS
+_LOGGER = logging.getLogger(__name__)
+
+
+class MessageBatcher:
+    # Buffers incoming messages and flushes the latest message per topic in batches
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, flush_callback: Callable[[List[MQTTMessage]], None],
+                 max_batch_size: int = DEFAULT_BATCH_SIZE, max_delay: float = DEFAULT_BATCH_DELAY):
+        self._loop = loop
+        self._flush_callback = flush_callback
+        self._max_batch_size = max_batch_size
+        self._max_delay = max_delay
+        self._buffer = OrderedDict()
+        self._timer = None
+
+    def add(self, message: MQTTMessage):
+        """Buffer a message, replacing any message for the same topic still waiting."""
+        self._buffer.pop(message.topic, None)
+        self._buffer[message.topic] = message
+
+        if len(self._buffer) >= self._max_batch_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = self._loop.call_later(self._max_delay, self.flush)
+
+    def flush(self):
+        """Hand every buffered message to the flush callback."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._buffer:
+            return
+
+        batch = list(self._buffer.values())
+        self._buffer = OrderedDict()
+        _LOGGER.debug(f"Flushing batch of {len(batch)} messages")
+        self._flush_callback(batch)
+
+    def cancel(self):
+        """Stop the pending flush and drop the buffered messages."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._buffer.clear()
+
+    @property
+    def pending(self):
+        """Return the number of buffered messages."""
+        return len(self._buffer)
@@ -0,0 +1,97 @@
+# IMPORTS
+import asyncio
+import logging
+import time
+from collections import (OrderedDict)
+
+# TYPES
+from typing import (Callable, Dict, Optional, Tuple)
+
+Publisher = Callable[[str, str], None]
+# (base topic, device id), the same device id may exist under several discovery prefixes
+DeviceKey = Tuple[str, str]
+
+# CONSTANTS
+DEFAULT_COALESCE_WINDOW = 0.1
+DEFAULT_RATE_LIMIT = 10
+
+# GLOBALS
+_LOGGER = logging.getLogger(__name__)
+
+
+class OutboundQueue:
+    # Coalesces writes to the same topic (last write wins) and publishes them within a per device rate limit
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, publish: Publisher,
+                 coalesce_window: float = DEFAULT_COALESCE_WINDOW, rate_limit: float = DEFAULT_RATE_LIMIT):
+        self._loop = loop
+        self._publish = publish
+        self._coalesce_window = coalesce_window
+        self._interval = 1 / rate_limit if rate_limit else 0
+        self._pending = OrderedDict()
+        self._next_allowed = dict()
+        self._timer = None
+        self._timer_deadline = None
+        self._published = 0
+        self._coalesced = 0
+
+    def put(self, device: DeviceKey, topic: str, payload: str):
+        """Queue a payload for a topic, replacing the payload still waiting for the same topic."""
+        if self._pending.pop(topic, None) is not None:
+            self._coalesced += 1
+        self._pending[topic] = (device, payload)
+        self._schedule(time.monotonic() + self._coalesce_window)
+
+    def flush(self, now: Optional[float] = None):
+        """Publish every waiting payload whose device is within its rate limit."""
+        self._timer = None
+        self._timer_deadline = None
+        if now is None:
+            now = time.monotonic()
+
+        next_deadline = None
+        for topic, (device, payload) in list(self._pending.items()):
+            allowed = self._next_allowed.get(device, 0)
+            if allowed > now:
+                # Held back, the device already used its share of this interval
+                if next_deadline is None or allowed < next_deadline:
+                    next_deadline = allowed
+                continue
+            del self._pending[topic]
+            self._next_allowed[device] = now + self._interval
+            self._published += 1
+            self._publish(topic, payload)
+
+        # Devices that have been quiet for a full interval need no bookkeeping
+        for device in [device for device, allowed in self._next_allowed.items() if allowed <= now - self._interval]:
+            del self._next_allowed[device]
+
+        if next_deadline is not None:
+            self._schedule(next_deadline)
+
+    def cancel(self):
+        """Stop the pending flush and drop the waiting payloads."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+            self._timer_deadline = None
+        self._pending.clear()
+
+    def _schedule(self, deadline: float):
+        # One timer for the whole queue, at the earliest deadline
+        if self._timer_deadline is not None and self._timer_deadline <= deadline:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer_deadline = deadline
+        self._timer = self._loop.call_later(max(0, deadline - time.monotonic()), self.flush)
+
+    @property
+    def pending(self):
+        """Return the number of payloads waiting to be published."""
+        return len(self._pending)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Return the number of published and coalesced payloads."""
+        return {'published': self._published, 'coalesced': self._coalesced}
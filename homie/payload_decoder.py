@@ -0,0 +1,126 @@
+# IMPORTS
+import logging
+import sys
+
+# TYPES
+from typing import (Callable, Optional, Tuple)
+
+Decoder = Callable[[str], object]
+
+# CONSTANTS
+DATATYPE_STRING = 'string'
+DATATYPE_INTEGER = 'integer'
+DATATYPE_FLOAT = 'float'
+DATATYPE_BOOLEAN = 'boolean'
+DATATYPE_ENUM = 'enum'
+DATATYPE_COLOR = 'color'
+DATATYPES = [DATATYPE_STRING, DATATYPE_INTEGER, DATATYPE_FLOAT, DATATYPE_BOOLEAN, DATATYPE_ENUM, DATATYPE_COLOR]
+COLOR_RGB = 'rgb'
+COLOR_HSV = 'hsv'
+COLOR_RANGES = {
+    COLOR_RGB: (255, 255, 255),
+    COLOR_HSV: (360, 100, 100),
+}
+BOOLEAN_VALUES = {'true': True, 'false': False}
+RANGE_SEPARATOR = ':'
+
+# GLOBALS
+_LOGGER = logging.getLogger(__name__)
+
+
+def parse_range(payload_format: Optional[str], number: Callable[[str], float] = float) -> Optional[Tuple[float, float]]:
+    """Return the (low, high) bounds of a numeric 'from:to' format, None when the value is unbounded."""
+    if not payload_format or RANGE_SEPARATOR not in payload_format:
+        return None
+    low, _, high = payload_format.partition(RANGE_SEPARATOR)
+    try:
+        low, high = number(low), number(high)
+    except ValueError:
+        _LOGGER.warning(f"Ignoring invalid range format: {payload_format}")
+        return None
+    return (low, high) if low <= high else (high, low)
+
+
+def _numeric_decoder(number: Callable[[str], float], payload_format: Optional[str]) -> Decoder:
+    bounds = parse_range(payload_format, number)
+    if bounds is None:
+        return number
+    low, high = bounds
+
+    def decode(payload: str):
+        value = number(payload)
+        if not low <= value <= high:
+            raise ValueError(f"{value} is outside of {low}:{high}")
+        return value
+    return decode
+
+
+def _boolean_decoder(payload_format: Optional[str]) -> Decoder:
+    def decode(payload: str):
+        return BOOLEAN_VALUES[payload]
+    return decode
+
+
+def _enum_decoder(payload_format: Optional[str]) -> Decoder:
+    # The lookup table hands out the same interned string for every payload of a value
+    values = {value: sys.intern(value) for value in (payload_format or '').split(',') if value}
+
+    def decode(payload: str):
+        if values:
+            return values[payload]
+        return payload
+    return decode
+
+
+def _color_decoder(payload_format: Optional[str]) -> Decoder:
+    maximums = COLOR_RANGES.get(payload_format, COLOR_RANGES[COLOR_RGB])
+
+    def decode(payload: str):
+        channels = tuple(int(channel) for channel in payload.split(','))
+        if len(channels) != len(maximums):
+            raise ValueError(f"Expected {len(maximums)} color channels")
+        for channel, maximum in zip(channels, maximums):
+            if not 0 <= channel <= maximum:
+                raise ValueError(f"{channel} is outside of 0:{maximum}")
+        return channels
+    return decode
+
+
+def _string_decoder(payload_format: Optional[str]) -> Decoder:
+    return str
+
+
+_DECODER_FACTORIES = {
+    DATATYPE_STRING: _string_decoder,
+    DATATYPE_INTEGER: lambda payload_format: _numeric_decoder(int, payload_format),
+    DATATYPE_FLOAT: lambda payload_format: _numeric_decoder(float, payload_format),
+    DATATYPE_BOOLEAN: _boolean_decoder,
+    DATATYPE_ENUM: _enum_decoder,
+    DATATYPE_COLOR: _color_decoder,
+}
+
+
+def compile_decoder(datatype: Optional[str], payload_format: Optional[str]) -> Decoder:
+    """Return a function that turns a payload into a value of the datatype, raising ValueError when it is invalid."""
+    factory = _DECODER_FACTORIES.get(datatype)
+    if factory is None:
+        if datatype is not None:
+            _LOGGER.warning(f"Unknown Homie datatype {datatype}, keeping payloads as strings")
+        return str
+    decoder = factory(payload_format)
+
+    def decode(payload: str):
+        try:
+            return decoder(payload)
+        except (KeyError, TypeError, ValueError) as error:
+            raise ValueError(f"Invalid {datatype} payload {payload!r}: {error}") from None
+    return decode
+
+
+def encode_value(value) -> str:
+    """Return the payload of a value, the reverse of the decoders."""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (tuple, list)):
+        return ','.join(str(channel) for channel in value)
+    return str(value)
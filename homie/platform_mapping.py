@@ -0,0 +1,47 @@
+# IMPORTS
+import logging
+from .payload_decoder import (DATATYPE_BOOLEAN, DATATYPE_INTEGER, DATATYPE_FLOAT, DATATYPE_COLOR)
+
+# TYPES
+from typing import (Optional)
+
+# CONSTANTS
+PLATFORM_SENSOR = 'sensor'
+PLATFORM_BINARY_SENSOR = 'binary_sensor'
+PLATFORM_SWITCH = 'switch'
+PLATFORM_LIGHT = 'light'
+PLATFORM_CLIMATE = 'climate'
+PLATFORMS = [PLATFORM_SENSOR, PLATFORM_BINARY_SENSOR, PLATFORM_SWITCH, PLATFORM_LIGHT, PLATFORM_CLIMATE]
+ANY = None
+UNTYPED = None
+LIGHT_NODE_TYPES = ('light', 'led', 'dimmer')
+
+# Maps a Property onto the platform of its entity, the first matching rule wins
+# (node types, datatypes, settable, platform), ANY matches every value
+PLATFORM_MAPPING = [
+    (LIGHT_NODE_TYPES, (DATATYPE_BOOLEAN, DATATYPE_INTEGER, DATATYPE_FLOAT, DATATYPE_COLOR), True, PLATFORM_LIGHT),
+    (('thermostat', 'climate', 'heating'), (DATATYPE_INTEGER, DATATYPE_FLOAT), True, PLATFORM_CLIMATE),
+    # Homie 2.0 switches and lights have no $datatype, their on/off payload stays a string the switch understands
+    (('switch', 'relay'), ANY, True, PLATFORM_SWITCH),
+    (LIGHT_NODE_TYPES, (UNTYPED,), True, PLATFORM_SWITCH),
+    (ANY, (DATATYPE_BOOLEAN,), True, PLATFORM_SWITCH),
+    (ANY, (DATATYPE_BOOLEAN,), False, PLATFORM_BINARY_SENSOR),
+    # Every other Property at least shows its state, settable or not
+    (ANY, ANY, ANY, PLATFORM_SENSOR),
+]
+
+# GLOBALS
+_LOGGER = logging.getLogger(__name__)
+
+
+def platform_for(node_type: Optional[str], datatype: Optional[str], settable: bool) -> Optional[str]:
+    """Return the platform of a Property, None when no entity is created for it."""
+    for node_types, datatypes, rule_settable, platform in PLATFORM_MAPPING:
+        if node_types is not ANY and node_type not in node_types:
+            continue
+        if datatypes is not ANY and datatype not in datatypes:
+            continue
+        if rule_settable is not ANY and rule_settable != settable:
+            continue
+        return platform
+    return None
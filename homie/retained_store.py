@@ -0,0 +1,116 @@
+# IMPORTS
+import logging
+import sys
+from collections import (OrderedDict)
+from .mqtt_message import (MQTTMessage)
+
+# TYPES
+from typing import (Iterator, Optional, Tuple)
+
+# CONSTANTS
+TOPIC_SEPARATOR = '/'
+EVICTION_LRU = 'lru'
+EVICTION_FIFO = 'fifo'
+EVICTION_POLICIES = [EVICTION_LRU, EVICTION_FIFO]
+DEFAULT_MAX_SIZE = 50000
+DEFAULT_EVICTION = EVICTION_LRU
+
+# GLOBALS
+_LOGGER = logging.getLogger(__name__)
+
+
+class _StoreNode:
+    # A single topic segment in the Retained Store
+    __slots__ = ('children', 'message')
+
+    def __init__(self):
+        self.children = dict()
+        self.message = None
+
+
+class RetainedStore:
+    # A bounded last value store per topic, late discovered objects are populated from it
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE, eviction: str = DEFAULT_EVICTION):
+        if eviction not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy: {eviction}")
+        if max_size < 1:
+            raise ValueError(f"The retained store must hold at least one topic, not {max_size}")
+        self._max_size = max_size
+        self._eviction = eviction
+        self._messages = OrderedDict()
+        self._root = _StoreNode()
+
+    def put(self, topic: str, message: MQTTMessage):
+        """Store the last message of a topic, evicting the oldest topic when full."""
+        if topic in self._messages:
+            if self._eviction == EVICTION_LRU:
+                self._messages.move_to_end(topic)
+        elif len(self._messages) >= self._max_size:
+            evicted_topic, _ = self._messages.popitem(last=False)
+            _LOGGER.debug(f"Retained Store full, evicting topic: {evicted_topic}")
+            self._remove_node(evicted_topic)
+
+        self._messages[topic] = message
+        node = self._root
+        for segment in topic.split(TOPIC_SEPARATOR):
+            child = node.children.get(segment)
+            if child is None:
+                child = node.children[sys.intern(segment)] = _StoreNode()
+            node = child
+        node.message = message
+
+    def get(self, topic: str) -> Optional[MQTTMessage]:
+        """Return the last message of a topic."""
+        message = self._messages.get(topic)
+        if message is not None and self._eviction == EVICTION_LRU:
+            self._messages.move_to_end(topic)
+        return message
+
+    def remove(self, topic: str):
+        """Forget the last message of a topic."""
+        if self._messages.pop(topic, None) is not None:
+            self._remove_node(topic)
+
+    def under(self, topic: str) -> Iterator[Tuple[str, MQTTMessage]]:
+        """Iterate the last messages of the topic and every topic below it."""
+        node = self._root
+        for segment in topic.split(TOPIC_SEPARATOR):
+            node = node.children.get(segment)
+            if node is None:
+                return
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node.message is not None:
+                yield node.message.topic, node.message
+            stack.extend(node.children.values())
+
+    @property
+    def max_size(self):
+        """Return the maximum number of topics kept."""
+        return self._max_size
+
+    @property
+    def eviction(self):
+        """Return the eviction policy of the store."""
+        return self._eviction
+
+    def __len__(self):
+        return len(self._messages)
+
+    def _remove_node(self, topic: str):
+        # Clear the message and prune segments that no longer lead anywhere
+        segments = topic.split(TOPIC_SEPARATOR)
+        path = [self._root]
+        for segment in segments:
+            node = path[-1].children.get(segment)
+            if node is None:
+                return
+            path.append(node)
+        path[-1].message = None
+        for index in range(len(segments), 0, -1):
+            node = path[index]
+            if node.children or node.message is not None:
+                return
+            del path[index - 1].children[segments[index - 1]]
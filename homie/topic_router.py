@@ -0,0 +1,53 @@
+# IMPORTS
+import logging
+from .retained_store import (RetainedStore)
+from .topic_tokenizer import (TopicTokenizer, TopicTokens)
+
+# TYPES
+from typing import (Any, Dict, List, Optional, Tuple)
+
+RetainedMessages = List[Tuple[TopicTokens, str]]
+
+# GLOBALS
+_LOGGER = logging.getLogger(__name__)
+
+
+class TopicRouter:
+    # Routes a tokenized message through the id registries (devices -> nodes -> properties) to the object that owns it,
+    # the topic itself is only ever split by the tokenizer
+
+    def __init__(self, store: RetainedStore, tokenizer: TopicTokenizer):
+        self._store = store
+        self._tokenizer = tokenizer
+        self._devices = dict()
+
+    def route(self, tokens: TopicTokens) -> Optional[Any]:
+        """Return the deepest discovered owner of the tokens."""
+        device = self._devices.get(tokens.device_id)
+        if device is None or tokens.node_id is None:
+            return device
+        node = device._nodes.get(tokens.node_id)
+        if node is None:
+            return device
+        if tokens.property_id is None:
+            return node
+        return node._properties.get(tokens.property_id) or node
+
+    def register(self, device: Any):
+        """Register a discovered device, its nodes and properties are found through it."""
+        self._devices[device.device_id] = device
+
+    def retained(self, owner: Any) -> RetainedMessages:
+        """Return the (tokens, payload) of the retained messages the owner is the deepest owner of."""
+        tokenize = self._tokenizer.tokenize
+        messages = list()
+        for topic, message in self._store.under(owner._prefix_topic):
+            tokens = tokenize(topic)
+            if tokens is not None and self.route(tokens) is owner:
+                messages.append((tokens, message.payload))
+        return messages
+
+    @property
+    def devices(self) -> Dict[str, Any]:
+        """Return the registered devices by device id."""
+        return self._devices
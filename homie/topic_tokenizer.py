@@ -0,0 +1,89 @@
+# IMPORTS
+import functools
+import logging
+import sys
+
+# TYPES
+from typing import (Dict, Optional)
+
+# CONSTANTS
+TOPIC_SEPARATOR = '/'
+ATTRIBUTE_PREFIX = '$'
+SET_TOPIC = 'set'
+TOPIC_DEVICE_ATTRIBUTE = 'device_attribute'
+TOPIC_NODE_ATTRIBUTE = 'node_attribute'
+TOPIC_PROPERTY_VALUE = 'property_value'
+TOPIC_PROPERTY_ATTRIBUTE = 'property_attribute'
+TOPIC_SET = 'set'
+TOPIC_KINDS = [TOPIC_DEVICE_ATTRIBUTE, TOPIC_NODE_ATTRIBUTE, TOPIC_PROPERTY_VALUE, TOPIC_PROPERTY_ATTRIBUTE, TOPIC_SET]
+DEFAULT_CACHE_SIZE = 50000
+
+# GLOBALS
+_LOGGER = logging.getLogger(__name__)
+
+
+class TopicTokens:
+    # The parts of a topic below the discovery prefix, shared by every message on the topic
+    __slots__ = ('kind', 'device_id', 'node_id', 'property_id', 'attribute')
+
+    def __init__(self, kind: str, device_id: str, node_id: Optional[str] = None, property_id: Optional[str] = None,
+                 attribute: Optional[str] = None):
+        self.kind = kind
+        self.device_id = device_id
+        self.node_id = node_id
+        self.property_id = property_id
+        self.attribute = attribute
+
+    def __repr__(self):
+        return f"TopicTokens({self.kind}, {self.device_id}, {self.node_id}, {self.property_id}, {self.attribute})"
+
+
+class TopicTokenizer:
+    # Splits a topic once and classifies it by its position in the Homie layout, cached per topic
+
+    def __init__(self, prefix: str, cache_size: int = DEFAULT_CACHE_SIZE):
+        self._prefix = prefix + TOPIC_SEPARATOR
+        self._prefix_length = len(self._prefix)
+        self.tokenize = functools.lru_cache(maxsize=cache_size)(self._tokenize)
+
+    def _tokenize(self, topic: str) -> Optional[TopicTokens]:
+        # None for every topic outside the layout, so it can not turn into a phantom device or node
+        if not topic.startswith(self._prefix):
+            return None
+        segments = topic[self._prefix_length:].split(TOPIC_SEPARATOR)
+        if len(segments) < 2 or not all(segments):
+            return None
+        device_id = sys.intern(segments[0])
+        if segments[1].startswith(ATTRIBUTE_PREFIX):
+            # Device attributes may be nested, like $stats/uptime or $fw/name
+            return TopicTokens(TOPIC_DEVICE_ATTRIBUTE, device_id, attribute=sys.intern(TOPIC_SEPARATOR.join(segments[1:])))
+        if segments[0].startswith(ATTRIBUTE_PREFIX) or len(segments) > 4:
+            return None
+
+        node_id = sys.intern(segments[1])
+        if len(segments) == 2:
+            return None
+        if segments[2].startswith(ATTRIBUTE_PREFIX):
+            if len(segments) != 3:
+                return None
+            return TopicTokens(TOPIC_NODE_ATTRIBUTE, device_id, node_id, attribute=sys.intern(segments[2]))
+
+        property_id = sys.intern(segments[2])
+        if len(segments) == 3:
+            return TopicTokens(TOPIC_PROPERTY_VALUE, device_id, node_id, property_id)
+        if segments[3].startswith(ATTRIBUTE_PREFIX):
+            return TopicTokens(TOPIC_PROPERTY_ATTRIBUTE, device_id, node_id, property_id, sys.intern(segments[3]))
+        if segments[3] == SET_TOPIC:
+            return TopicTokens(TOPIC_SET, device_id, node_id, property_id)
+        return None
+
+    @property
+    def prefix(self):
+        """Return the discovery prefix the topics are tokenized under."""
+        return self._prefix[:-1]
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Return the hits, misses and size of the tokenization cache."""
+        info = self.tokenize.cache_info()
+        return {'hits': info.hits, 'misses': info.misses, 'size': info.currsize}
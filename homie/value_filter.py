@@ -0,0 +1,78 @@
+# IMPORTS
+import logging
+
+# TYPES
+from typing import (List, Optional, Tuple)
+
+# CONSTANTS
+TOPIC_SEPARATOR = '/'
+WILDCARD_SEGMENT = '+'
+WILDCARD_REST = '#'
+
+# GLOBALS
+_LOGGER = logging.getLogger(__name__)
+
+
+class ValueFilter:
+    # Decides whether a new value of a Property is worth a state write
+    __slots__ = ('change_only', 'deadband', 'deadband_percent', 'min_interval')
+
+    def __init__(self, change_only: bool = True, deadband: float = 0, deadband_percent: float = 0, min_interval: float = 0):
+        self.change_only = change_only
+        self.deadband = deadband
+        self.deadband_percent = deadband_percent
+        self.min_interval = min_interval
+
+    @property
+    def is_default(self):
+        """Return True if the filter only drops unchanged values, which every Property already does."""
+        return self.change_only and not self.deadband and not self.deadband_percent and not self.min_interval
+
+    def wait(self, last_write: Optional[float], now: float) -> float:
+        """Return the seconds left of the minimum interval since the last write, 0 when a value may be written now."""
+        if not self.min_interval or last_write is None:
+            return 0
+        return max(self.min_interval - (now - last_write), 0)
+
+    def accept(self, old_value, new_value) -> bool:
+        """Return True if the new value should be written, compared with the last value that was written."""
+        if old_value is None:
+            return True
+        if new_value == old_value:
+            return not self.change_only
+        if _is_number(old_value) and _is_number(new_value):
+            delta = abs(new_value - old_value)
+            if delta <= self.deadband:
+                return False
+            if self.deadband_percent and old_value and delta * 100 <= abs(old_value) * self.deadband_percent:
+                return False
+        return True
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class ValueFilters:
+    # The default filter and the per property filters, matched on <device>/<node>/<property> with + and # wildcards
+
+    def __init__(self, default: ValueFilter, rules: List[Tuple[str, ValueFilter]] = None):
+        self._default = None if default.is_default else default
+        self._rules = [(pattern.split(TOPIC_SEPARATOR), value_filter) for pattern, value_filter in rules or list()]
+
+    def for_property(self, device_id: str, node_id: str, property_id: str) -> Optional[ValueFilter]:
+        """Return the filter of the first matching rule, None when values only need to change to be written."""
+        segments = (device_id, node_id, property_id)
+        for patterns, value_filter in self._rules:
+            if _matches(patterns, segments):
+                return None if value_filter.is_default else value_filter
+        return self._default
+
+
+def _matches(patterns: List[str], segments: Tuple[str, ...]) -> bool:
+    for index, pattern in enumerate(patterns):
+        if pattern == WILDCARD_REST:
+            return True
+        if index >= len(segments) or (pattern != WILDCARD_SEGMENT and pattern != segments[index]):
+            return False
+    return len(patterns) == len(segments)
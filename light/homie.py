@@ -0,0 +1,115 @@
+# IMPORT
+import asyncio
+import logging
+
+from homeassistant.components.light import (ATTR_BRIGHTNESS, ATTR_HS_COLOR, SUPPORT_BRIGHTNESS, SUPPORT_COLOR, Light)
+import homeassistant.util.color as color_util
+from custom_components.homie.entity import (HomieEntity, setup_homie_entities)
+from custom_components.homie.payload_decoder import (DATATYPE_BOOLEAN, DATATYPE_INTEGER, DATATYPE_COLOR, COLOR_HSV)
+
+# TYPINGS
+from homeassistant.helpers.typing import (HomeAssistantType, ConfigType)
+
+# CONSTANTS
+_LOGGER = logging.getLogger(__name__)
+DEFAULT_RANGE = (0, 100)
+MAX_BRIGHTNESS = 255
+
+@asyncio.coroutine
+def async_setup_platform(hass: HomeAssistantType, config: ConfigType, async_add_entities, discovery_info=None):
+    """Set up the Homie light."""
+    _LOGGER.info(f"Setting up Homie Light: {config} - {discovery_info}")
+    setup_homie_entities(hass, discovery_info, async_add_entities, HomieLight)
+    return None
+
+
+class HomieLight(HomieEntity, Light):
+    """Implementation of a Homie Light, on/off for booleans, dimmable for numbers and colored for colors."""
+
+    @property
+    def _is_hsv(self):
+        return self._property.format == COLOR_HSV
+
+    @property
+    def _range(self):
+        return self._property.range or DEFAULT_RANGE
+
+    @property
+    def supported_features(self):
+        """Flag supported features."""
+        datatype = self._property.datatype
+        if datatype == DATATYPE_BOOLEAN:
+            return 0
+        if datatype == DATATYPE_COLOR:
+            return SUPPORT_BRIGHTNESS | SUPPORT_COLOR
+        return SUPPORT_BRIGHTNESS
+
+    @property
+    def is_on(self):
+        """Return true if the Homie Light is on."""
+        value = self._property.value
+        if value is None:
+            return False
+        datatype = self._property.datatype
+        if datatype == DATATYPE_BOOLEAN:
+            return value is True
+        if datatype == DATATYPE_COLOR:
+            return (value[2] if self._is_hsv else max(value)) > 0
+        return value > self._range[0]
+
+    @property
+    def brightness(self):
+        """Return the brightness of the Homie Light between 0..255."""
+        value = self._property.value
+        datatype = self._property.datatype
+        if value is None or datatype == DATATYPE_BOOLEAN:
+            return None
+        if datatype == DATATYPE_COLOR:
+            return round(value[2] * MAX_BRIGHTNESS / 100) if self._is_hsv else max(value)
+        low, high = self._range
+        return round((value - low) / (high - low) * MAX_BRIGHTNESS) if high > low else MAX_BRIGHTNESS
+
+    @property
+    def hs_color(self):
+        """Return the hue and saturation of the Homie Light."""
+        value = self._property.value
+        if value is None or self._property.datatype != DATATYPE_COLOR:
+            return None
+        if self._is_hsv:
+            return value[0], value[1]
+        return color_util.color_RGB_to_hs(*value)
+
+    @asyncio.coroutine
+    def async_turn_on(self, **kwargs):
+        """Turn the Homie Light on, the state is optimistic until the device confirms it."""
+        datatype = self._property.datatype
+        if datatype == DATATYPE_BOOLEAN:
+            self._property.set_value(True)
+            return
+
+        brightness = kwargs.get(ATTR_BRIGHTNESS, self.brightness if self.is_on else MAX_BRIGHTNESS)
+        if datatype == DATATYPE_COLOR:
+            hue, saturation = kwargs.get(ATTR_HS_COLOR, self.hs_color or (0, 0))
+            if self._is_hsv:
+                self._property.set_value((round(hue), round(saturation), round(brightness * 100 / MAX_BRIGHTNESS)))
+            else:
+                red, green, blue = color_util.color_hs_to_RGB(hue, saturation)
+                self._property.set_value(tuple(round(channel * brightness / MAX_BRIGHTNESS) for channel in (red, green, blue)))
+            return
+
+        low, high = self._range
+        value = low + brightness / MAX_BRIGHTNESS * (high - low)
+        self._property.set_value(round(value) if datatype == DATATYPE_INTEGER else value)
+
+    @asyncio.coroutine
+    def async_turn_off(self, **kwargs):
+        """Turn the Homie Light off, the state is optimistic until the device confirms it."""
+        datatype = self._property.datatype
+        if datatype == DATATYPE_BOOLEAN:
+            self._property.set_value(False)
+        elif datatype == DATATYPE_COLOR:
+            hue, saturation = self.hs_color or (0, 0)
+            self._property.set_value((round(hue), round(saturation), 0) if self._is_hsv else (0, 0, 0))
+        else:
+            low = self._range[0]
+            self._property.set_value(round(low) if datatype == DATATYPE_INTEGER else low)
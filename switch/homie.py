@@ -0,0 +1,40 @@
+# IMPORT
+import asyncio
+import logging
+
+from homeassistant.components.switch import (SwitchDevice)
+from custom_components.homie.entity import (HomieEntity, setup_homie_entities)
+
+# TYPINGS
+from homeassistant.helpers.typing import (HomeAssistantType, ConfigType)
+
+# CONSTANTS
+_LOGGER = logging.getLogger(__name__)
+ON_VALUES = (True, 'true')
+
+@asyncio.coroutine
+def async_setup_platform(hass: HomeAssistantType, config: ConfigType, async_add_entities, discovery_info=None):
+    """Set up the Homie switch."""
+    _LOGGER.info(f"Setting up Homie Switch: {config} - {discovery_info}")
+    setup_homie_entities(hass, discovery_info, async_add_entities, HomieSwitch)
+    return None
+
+
+class HomieSwitch(HomieEntity, SwitchDevice):
+    """Implementation of a Homie Switch."""
+
+    @asyncio.coroutine
+    def async_turn_on(self, **kwargs):
+        """Turn the Homie Switch on, the state is optimistic until the device confirms it."""
+        self._property.set_value(True)
+
+    @asyncio.coroutine
+    def async_turn_off(self, **kwargs):
+        """Turn the Homie Switch off, the state is optimistic until the device confirms it."""
+        self._property.set_value(False)
+
+    @property
+    def is_on(self):
+        """Return true if the Homie Switch is on."""
+        # Homie 2.0 switches have no $datatype, their payload stays a string
+        return self._property.value in ON_VALUES
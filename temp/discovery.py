@@ -15,7 +15,6 @@
 import asyncio
 import json
 import logging
-import re
 
 import homeassistant.components.mqtt as mqtt
 from homeassistant.helpers.discovery import async_load_platform
@@ -28,16 +27,80 @@ from homeassistant.components.mqtt import (
 
 _LOGGER = logging.getLogger(__name__)
 
-messages = {}
-nodes = {}
-
-TOPIC_NODES = re.compile(r'(?P<prefix_topic>[$\w]+[-\w]*\w)/(?P<device>[$\w]+[-\w]*\w)/\$nodes')
-TOPIC_ONLINE = re.compile(r'(?P<prefix_topic>[$\w]+[-\w]*\w)/(?P<device>[$\w]+[-\w]*\w)/\$online')
-TOPIC_NODE_PROPERTIES = re.compile(r'(?P<prefix_topic>[$\w]+[-\w]*\w)/(?P<device>[$\w]+[-\w]*\w)/(?P<node>[$\w]+[-\w]*\w)/\$properties')
+devices = {}
 
 STATE_ONLINE = 'true'
 ALREADY_DISCOVERED = 'mqtt_discovered_components'
 
+# Discovery states of a device, a device only ever moves forward through them
+STATE_ANNOUNCED = 'announced'
+STATE_ATTRIBUTES = 'attributes'
+STATE_NODES = 'nodes'
+STATE_PROPERTIES = 'properties'
+STATE_READY = 'ready'
+
+
+class DiscoveryDevice:
+    """Discovery state of a single device, driven one message at a time."""
+
+    def __init__(self, base_topic, device):
+        self.base_topic = base_topic
+        self.device = device
+        self.name = None
+        self.online = False
+        self.nodes = None
+        self.properties = {}
+        self.values = {}
+        self.loaded = set()
+        self.state = STATE_ANNOUNCED
+
+    def apply(self, path, payload):
+        """Apply a message relative to the device and return True when it has nodes that are ready to be loaded."""
+        if path == ['$online']:
+            _LOGGER.warning("Online Match[%s]: %s", self.device, payload)
+            self.online = payload.lower() == STATE_ONLINE
+        elif path == ['$name']:
+            self.name = payload
+        elif path == ['$nodes']:
+            self.nodes = {}
+            for a in payload.split(','):
+                b = a.split(':')
+                self.nodes[b[0]] = b[1] if len(b) > 1 else None
+        elif len(path) == 2 and path[1] == '$properties':
+            self.properties[path[0]] = payload.split(',')
+        elif len(path) == 2:
+            self.values[tuple(path)] = payload
+        else:
+            return False
+        if self.state == STATE_READY:
+            # Nodes completed after ready are loaded too, like HomieDevice keeps discovering nodes
+            return len(path) == 2 and self.node_complete(path[0]) and path[0] not in self.loaded
+        return self.advance()
+
+    def node_complete(self, node):
+        """Return True once the $properties of a node and all their values are known."""
+        return node in self.properties and all((node, prop) in self.values for prop in self.properties[node])
+
+    @property
+    def node_ids(self):
+        """Return the nodes from $nodes, or the nodes seen through their $properties when it is not published."""
+        return self.nodes if self.nodes is not None else self.properties
+
+    def advance(self):
+        """Step through the discovery states as far as the known topics allow."""
+        if self.state == STATE_READY:
+            return False
+        if self.state == STATE_ANNOUNCED and self.online and self.name is not None:
+            self.state = STATE_ATTRIBUTES
+        if self.state == STATE_ATTRIBUTES and self.node_ids:
+            self.state = STATE_NODES
+        if self.state == STATE_NODES and all(node in self.properties for node in self.node_ids):
+            self.state = STATE_PROPERTIES
+        if self.state == STATE_PROPERTIES and all(self.node_complete(node) for node in self.node_ids):
+            self.state = STATE_READY
+            return True
+        return False
+
 
 @asyncio.coroutine
 def async_start(hass, discovery_topic, hass_config):
@@ -47,68 +110,57 @@ def async_start(hass, discovery_topic, hass_config):
     def async_device_message_received(topic, payload, qos):
         """Process the received message."""
         #_LOGGER.warning("mqdiscover | [%s]:[%s]:[%s]", qos, topic, payload)
-        
-        # List of all topics published on MQTT since HA was started
-        messages[topic] = payload
-        
-        # Check if the topic is a list of nodes
-        match_nodes = TOPIC_NODES.match(topic)
-        if match_nodes:
-            arr = payload.split(",")
-            nodelist = {}
-            for a in arr:
-                b = a.split(':')
-                nodelist[b[0]] = b[1]
-            device = match_nodes.group('device')
-            nodes[device] = nodelist
-            #for key, val in nodes.items():
-                #for key2, val2 in val.items():
-                    #_LOGGER.warning("Device:[%s] - Node:[%s] - Type:[%s]", key, key2, val2)
-        
-        # Check if topic is $online topic
-        match_online = TOPIC_ONLINE.match(topic)
-        if match_online:
-            _LOGGER.warning("Online Match[%s]: %s", match_online.group('device'), payload)
-            if payload.lower() == STATE_ONLINE:
-                device = match_online.group('device')
-                base_topic = match_online.group('prefix_topic')
-                
-                for m_key in list(messages):
-                    match_node_prop = TOPIC_NODE_PROPERTIES.match(m_key)
-                    if match_node_prop:
-                        if match_node_prop.group('device') == device:
-                            node = match_node_prop.group('node')
-                            config = {}
-                            for prop in messages[m_key].split(','):
-                                _LOGGER.warning("Device:[%s] - Node:[%s] - Prop:[%s] - Value:[%s]", device, node, prop, messages['{}/{}/{}/{}'.format(base_topic, device, node, prop)])
-                                if prop == 'unit':
-                                    config[CONF_UNIT_OF_MEASUREMENT] = messages['{}/{}/{}/{}'.format(base_topic, device, node, prop)]
-                                else:
-                                    config[CONF_STATE_TOPIC] = '{}/{}/{}/{}'.format(base_topic, device, node, prop)
-                                    config[CONF_NAME] = messages['{}/{}/$name'.format(base_topic,device)] + ' ' + prop
-                            platform = 'mqtt'
-                            component = 'sensor'
-                            config[CONF_PLATFORM] = platform
-                            if ALREADY_DISCOVERED not in hass.data:
-                                hass.data[ALREADY_DISCOVERED] = set()
-                            
-                            discovery_id = '_'.join((device, node))
-                            discovery_hash = (component, discovery_id)
-                            if discovery_hash in hass.data[ALREADY_DISCOVERED]:
-                                _LOGGER.info("Component has already been discovered: %s %s",
-                                             component, discovery_id)
-                                return
-
-                            hass.data[ALREADY_DISCOVERED].add(discovery_hash)
-
-                            _LOGGER.info("Found new component: %s %s", component, discovery_id)
-
-                            yield from async_load_platform(
-                                hass, component, platform, config, hass_config)    
-                                
-                                
-
-        return
+
+        # Only the device the message belongs to is touched
+        path = topic.split('/')
+        if len(path) < 3:
+            return
+        base_topic, device = path[0], path[1]
+        if device not in devices:
+            devices[device] = DiscoveryDevice(base_topic, device)
+        discovery_device = devices[device]
+
+        # A device becomes ready exactly once
+        if discovery_device.apply(path[2:], payload):
+            yield from async_discover_device(discovery_device)
+
+    @asyncio.coroutine
+    def async_discover_device(discovery_device):
+        """Load a sensor for every node of a ready device."""
+        device = discovery_device.device
+        base_topic = discovery_device.base_topic
+        for node in discovery_device.node_ids:
+            if not discovery_device.node_complete(node) or node in discovery_device.loaded:
+                continue
+            discovery_device.loaded.add(node)
+            config = {}
+            for prop in discovery_device.properties[node]:
+                value = discovery_device.values[(node, prop)]
+                _LOGGER.warning("Device:[%s] - Node:[%s] - Prop:[%s] - Value:[%s]", device, node, prop, value)
+                if prop == 'unit':
+                    config[CONF_UNIT_OF_MEASUREMENT] = value
+                else:
+                    config[CONF_STATE_TOPIC] = '{}/{}/{}/{}'.format(base_topic, device, node, prop)
+                    config[CONF_NAME] = discovery_device.name + ' ' + prop
+            platform = 'mqtt'
+            component = 'sensor'
+            config[CONF_PLATFORM] = platform
+            if ALREADY_DISCOVERED not in hass.data:
+                hass.data[ALREADY_DISCOVERED] = set()
+
+            discovery_id = '_'.join((device, node))
+            discovery_hash = (component, discovery_id)
+            if discovery_hash in hass.data[ALREADY_DISCOVERED]:
+                _LOGGER.info("Component has already been discovered: %s %s",
+                             component, discovery_id)
+                continue
+
+            hass.data[ALREADY_DISCOVERED].add(discovery_hash)
+
+            _LOGGER.info("Found new component: %s %s", component, discovery_id)
+
+            yield from async_load_platform(
+                hass, component, platform, config, hass_config)
 
     # Listen for all MQTT messages on base topic
     yield from mqtt.async_subscribe(